@@ -0,0 +1,409 @@
+"""巴法云集成端到端压测.
+
+在独立线程中运行 benchmarks.emulator, 让真实的 async_setup_entry 连接到模拟器,
+分别在 100/1k/10k 个主题下测量:
+
+- 集成加载耗时(首次轮询 + MQTT连接 + 平台加载)
+- 持续推送时的消息吞吐(条/秒)
+- 从模拟器发出消息到实体状态写入的延迟分位数
+- 事件循环延迟
+- 单次REST轮询的耗时和轮询期间占用执行器线程的时间
+
+运行方式(需要安装 homeassistant 和 paho-mqtt):
+
+    python -m benchmarks.bench_integration --topics 100 1000 10000 --rate 2000
+
+对比两种MQTT传输模式:
+
+    python -m benchmarks.bench_integration --transport thread asyncio
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from homeassistant import bootstrap, config_entries, loader
+from homeassistant.const import EVENT_STATE_CHANGED
+from homeassistant.core import CoreState, Event, HomeAssistant, callback
+from homeassistant.helpers import entity_registry as er
+
+from .emulator import BemfaEmulator, synthetic_topics
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from custom_components.bemfa_to_homeassistant import api, transport  # noqa: E402
+from custom_components.bemfa_to_homeassistant.diagnostics import (  # noqa: E402
+    async_get_config_entry_diagnostics,
+)
+from custom_components.bemfa_to_homeassistant.const import (  # noqa: E402
+    API_RATE,
+    CONF_API_KEY,
+    CONF_INBOX_WINDOW,
+    CONF_MQTT_SHARDS,
+    CONF_SENSOR_DEADBANDS,
+    CONF_SENSOR_MIN_INTERVAL,
+    CONF_TRANSPORT,
+    DEFAULT_INBOX_WINDOW,
+    DEFAULT_TRANSPORT,
+    DOMAIN,
+    TRANSPORT_ASYNCIO,
+    TRANSPORT_THREAD,
+)
+
+# 事件循环延迟采样间隔(秒)
+LAG_PROBE_INTERVAL = 0.01
+
+# 轮询测量的间隔(秒), 略大于令牌桶的补充间隔, 使每次轮询都不需要等待令牌
+POLL_PROBE_INTERVAL = 1 / API_RATE + 0.1
+
+class EmulatorThread:
+    """在独立线程和事件循环中运行模拟器, 避免与被测集成争抢事件循环."""
+
+    def __init__(self, topics: dict[str, str]) -> None:
+        """初始化."""
+        self.emulator = BemfaEmulator(topics, echo_delay=0.05)
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+
+    def start(self) -> None:
+        """启动模拟器线程."""
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self.emulator.start(), self.loop).result()
+
+    def stop(self) -> None:
+        """停止模拟器线程."""
+        asyncio.run_coroutine_threadsafe(self.emulator.stop(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+
+    def publish_burst(self, updates: dict[str, str]) -> float:
+        """在模拟器线程中发布一批消息, 返回发布时间."""
+        sent_at = time.perf_counter()
+        self.loop.call_soon_threadsafe(self.emulator.publish_burst, updates)
+        return sent_at
+
+class LoopLagProbe:
+    """定时睡眠并记录实际唤醒的延迟."""
+
+    def __init__(self) -> None:
+        """初始化."""
+        self.samples: list[float] = []
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        """开始采样."""
+        self.samples.clear()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        """停止采样."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self) -> None:
+        """采样循环."""
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(LAG_PROBE_INTERVAL)
+            self.samples.append(time.perf_counter() - start - LAG_PROBE_INTERVAL)
+
+class ExecutorProbe:
+    """统计事件循环提交到执行器的任务数和任务在执行器线程中的耗时."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop) -> None:
+        """初始化."""
+        self.jobs = 0
+        self.busy = 0.0
+        self._loop = loop
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        """开始统计."""
+        run_in_executor = self._loop.run_in_executor
+
+        def probed_run_in_executor(executor, func, *args):
+            def timed():
+                start = time.perf_counter()
+                try:
+                    return func(*args)
+                finally:
+                    with self._lock:
+                        self.jobs += 1
+                        self.busy += time.perf_counter() - start
+
+            return run_in_executor(executor, timed)
+
+        self._loop.run_in_executor = probed_run_in_executor
+
+    def stop(self) -> None:
+        """停止统计."""
+        del self._loop.run_in_executor
+
+def percentiles(samples: list[float]) -> dict[str, float]:
+    """计算毫秒单位的分位数."""
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def pick(fraction: float) -> float:
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000
+
+    return {
+        "p50": round(pick(0.50), 2),
+        "p90": round(pick(0.90), 2),
+        "p99": round(pick(0.99), 2),
+        "max": round(ordered[-1] * 1000, 2),
+        "mean": round(statistics.fmean(ordered) * 1000, 2),
+    }
+
+async def async_create_hass(config_dir: str) -> HomeAssistant:
+    """创建一个只加载注册表的最小 Home Assistant 实例."""
+    hass = HomeAssistant(config_dir)
+    hass.config.skip_pip = True
+    loader.async_setup(hass)
+    hass.config_entries = config_entries.ConfigEntries(hass, {})
+    await hass.config_entries.async_initialize()
+    await bootstrap.load_registries(hass)
+    hass.state = CoreState.running
+    return hass
+
+def sensor_payload(temperature: float) -> str:
+    """生成只有温度变化的 004 传感器消息."""
+    return f"#{temperature:.2f}#45#on#300#12#72"
+
+async def async_run(
+    topic_count: int,
+    rate: int,
+    duration: float,
+    mode: str,
+    window: int,
+    shards: int = 1,
+    diagnostics: bool = False,
+    polls: int = 5,
+) -> dict:
+    """对一个主题规模执行一轮压测."""
+    topics = synthetic_topics(topic_count)
+    emulator = EmulatorThread(topics)
+    emulator.start()
+
+    api.BEMFA_API_URL = emulator.emulator.api_url
+    api.BEMFA_MSG_API_URL = emulator.emulator.msg_api_url
+    transport.MQTT_HOST = "127.0.0.1"
+    transport.MQTT_PORT = emulator.emulator.mqtt_port
+
+    with tempfile.TemporaryDirectory() as config_dir:
+        hass = await async_create_hass(config_dir)
+
+        entry = config_entries.ConfigEntry(
+            version=1,
+            minor_version=1,
+            domain=DOMAIN,
+            title="bench",
+            data={CONF_API_KEY: f"bench{topic_count}"},
+            options={
+                CONF_TRANSPORT: mode,
+                CONF_INBOX_WINDOW: window,
+                CONF_MQTT_SHARDS: shards,
+                # 关闭温度的数值过滤, 测量的是消息到状态写入的延迟而不是过滤间隔
+                CONF_SENSOR_DEADBANDS: "temperature=0",
+                CONF_SENSOR_MIN_INTERVAL: 0,
+            },
+            source=config_entries.SOURCE_USER,
+        )
+
+        probe = LoopLagProbe()
+        probe.start()
+        start = time.perf_counter()
+        await hass.config_entries.async_add(entry)
+        await hass.async_block_till_done()
+        setup_time = time.perf_counter() - start
+        setup_lag = percentiles(probe.samples)
+        await probe.stop()
+
+        if entry.state is not config_entries.ConfigEntryState.LOADED:
+            raise RuntimeError(f"集成加载失败: {entry.state}")
+
+        runtime = hass.data[DOMAIN][entry.entry_id]
+        deadline = time.perf_counter() + 30
+        while not runtime["mqtt_client"].fully_subscribed:
+            if time.perf_counter() > deadline:
+                raise RuntimeError("等待订阅确认超时")
+            await asyncio.sleep(0.01)
+
+        registry = er.async_get(hass)
+        sensor_topics = [topic for topic in topics if topic.endswith("004")]
+        entity_topics = {
+            registry.async_get_entity_id(
+                "sensor", DOMAIN, f"{DOMAIN}_{topic}_temperature"
+            ): topic
+            for topic in sensor_topics
+        }
+        pending: dict[str, tuple[str, float]] = {}
+        latencies: list[float] = []
+        written = 0
+
+        @callback
+        def state_changed(event: Event) -> None:
+            """记录消息到状态写入的延迟."""
+            nonlocal written
+            topic = entity_topics.get(event.data["entity_id"])
+            if topic is None or (new_state := event.data["new_state"]) is None:
+                return
+            written += 1
+            expected = pending.get(topic)
+            if expected is not None and new_state.state == expected[0]:
+                latencies.append(time.perf_counter() - expected[1])
+                del pending[topic]
+
+        unsub = hass.bus.async_listen(EVENT_STATE_CHANGED, state_changed)
+
+        # 每 10ms 发布一批消息, 每条消息的温度都不同以确保触发状态写入
+        tick = 0.01
+        per_tick = max(1, int(rate * tick))
+        sequence = 0
+        published = 0
+        inbox = runtime["inbox"]
+        received_before = inbox.received
+        probe.start()
+        start = time.perf_counter()
+        while (elapsed := time.perf_counter() - start) < duration:
+            updates = {}
+            for topic in random.sample(sensor_topics, min(per_tick, len(sensor_topics))):
+                sequence += 1
+                temperature = 10 + (sequence % 200000) / 100
+                updates[topic] = sensor_payload(temperature)
+                pending[topic] = (str(float(f"{temperature:.2f}")), 0.0)
+            sent_at = emulator.publish_burst(updates)
+            for topic in updates:
+                pending[topic] = (pending[topic][0], sent_at)
+            published += len(updates)
+            await asyncio.sleep(max(0, (tick * (published / per_tick)) - elapsed))
+
+        publish_time = time.perf_counter() - start
+        received = inbox.received - received_before
+        await probe.stop()
+
+        # 等待剩余消息处理完毕
+        drain_start = time.perf_counter()
+        drain_deadline = drain_start + 10
+        while pending and time.perf_counter() < drain_deadline:
+            await asyncio.sleep(0.01)
+        drain_time = time.perf_counter() - drain_start
+        unsub()
+
+        # 逐次强制轮询, 测量每次轮询的耗时以及轮询期间执行器线程被占用的时间
+        coordinator = runtime["coordinator"]
+        poll_times: list[float] = []
+        executor = ExecutorProbe(hass.loop)
+        executor.start()
+        poll_probe = LoopLagProbe()
+        poll_probe.start()
+        for _ in range(polls):
+            await asyncio.sleep(POLL_PROBE_INTERVAL)
+            poll_start = time.perf_counter()
+            await coordinator.async_refresh()
+            poll_times.append(time.perf_counter() - poll_start)
+            if not coordinator.last_update_success:
+                raise RuntimeError("轮询失败")
+        await poll_probe.stop()
+        executor.stop()
+
+        # 强制重连, 测量从发起重连到所有分片都收到全部订阅确认的耗时
+        mqtt_client = runtime["mqtt_client"]
+        reconnect_start = time.perf_counter()
+        await mqtt_client.async_reconnect()
+        deadline = time.perf_counter() + 30
+        while not mqtt_client.fully_subscribed:
+            if time.perf_counter() > deadline:
+                raise RuntimeError("等待重连后的订阅确认超时")
+            await asyncio.sleep(0.001)
+        reconnect_time = time.perf_counter() - reconnect_start
+
+        result = {
+            "topics": topic_count,
+            "mode": mode,
+            "shards": shards,
+            "inbox_window_ms": window,
+            "setup_s": round(setup_time, 3),
+            "setup_loop_lag_ms": setup_lag,
+            "subscribe_s": round(runtime["mqtt_client"].last_subscribe_duration or 0, 3),
+            "reconnect_to_subscribed_s": round(reconnect_time, 3),
+            "resubscribe_s": round(mqtt_client.last_subscribe_duration or 0, 3),
+            "published": published,
+            "received": received,
+            "coalesced": inbox.coalesced,
+            "state_writes": written,
+            "lost": len(pending),
+            "msgs_per_s": round(received / publish_time, 1),
+            "drain_s": round(drain_time, 3),
+            "latency_ms": percentiles(latencies),
+            "loop_lag_ms": percentiles(probe.samples),
+            "poll_ms": percentiles(poll_times),
+            "poll_executor_jobs": executor.jobs,
+            "poll_executor_busy_ms": round(executor.busy * 1000, 2),
+            "poll_loop_lag_ms": percentiles(poll_probe.samples),
+        }
+        if diagnostics:
+            result["diagnostics"] = await async_get_config_entry_diagnostics(hass, entry)
+
+        await hass.config_entries.async_unload(entry.entry_id)
+        await hass.async_block_till_done()
+        await hass.async_stop(force=True)
+
+    emulator.stop()
+    return result
+
+def main() -> None:
+    """命令行入口."""
+    parser = argparse.ArgumentParser(description="巴法云集成端到端压测")
+    parser.add_argument("--topics", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--rate", type=int, default=1000, help="每秒发布的消息数")
+    parser.add_argument("--duration", type=float, default=10, help="每轮压测秒数")
+    parser.add_argument(
+        "--transport",
+        choices=[TRANSPORT_THREAD, TRANSPORT_ASYNCIO],
+        nargs="+",
+        default=[DEFAULT_TRANSPORT],
+        help="MQTT传输模式, 给出多个时对每个主题规模依次测量以便对比",
+    )
+    parser.add_argument("--inbox-window", type=int, default=DEFAULT_INBOX_WINDOW)
+    parser.add_argument("--shards", type=int, default=1, help="MQTT连接分片数")
+    parser.add_argument(
+        "--diagnostics", action="store_true", help="同时输出集成的诊断信息"
+    )
+    parser.add_argument("--polls", type=int, default=5, help="测量耗时的轮询次数")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    for topic_count in args.topics:
+        for mode in args.transport:
+            result = asyncio.run(
+                async_run(
+                    topic_count,
+                    args.rate,
+                    args.duration,
+                    mode,
+                    args.inbox_window,
+                    args.shards,
+                    args.diagnostics,
+                    args.polls,
+                )
+            )
+            print(json.dumps(result, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,324 @@
+"""巴法云云端模拟器.
+
+在本地提供一个最小的 MQTT 3.1.1 服务器和 alltopic/getmsg HTTP 接口, 并生成 N 个
+覆盖所有设备类型的虚拟设备, 用于在不连接 bemfa.com 的情况下对集成进行压测.
+
+单独运行:
+
+    python -m benchmarks.emulator --topics 1000 --mqtt-port 9501 --http-port 8080
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import struct
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+
+from aiohttp import web
+
+CONNECT = 1
+CONNACK = 2
+PUBLISH = 3
+PUBACK = 4
+SUBSCRIBE = 8
+SUBACK = 9
+UNSUBSCRIBE = 10
+UNSUBACK = 11
+PINGREQ = 12
+PINGRESP = 13
+DISCONNECT = 14
+
+# 每种设备类型的主题后缀和初始消息
+DEVICE_SAMPLES = {
+    "001": "on",
+    "002": "on#80#4000",
+    "003": "on#2#1",
+    "004": "#23.5#45#on#300#12#72",
+    "005": "on#2#26#1#0#0",
+    "006": "off",
+    "009": "on#50",
+}
+
+SET_SUFFIX = "/set"
+
+def _encode_length(length: int) -> bytes:
+    """编码剩余长度."""
+    encoded = bytearray()
+    while True:
+        byte, length = length % 128, length // 128
+        encoded.append(byte | 0x80 if length else byte)
+        if not length:
+            return bytes(encoded)
+
+def _encode_string(value: str) -> bytes:
+    """编码带长度前缀的字符串."""
+    data = value.encode()
+    return struct.pack("!H", len(data)) + data
+
+def _packet(packet_type: int, flags: int, body: bytes) -> bytes:
+    """生成MQTT报文."""
+    return bytes([packet_type << 4 | flags]) + _encode_length(len(body)) + body
+
+def synthetic_topics(count: int) -> dict[str, str]:
+    """生成 count 个覆盖所有设备类型的主题及其初始消息."""
+    suffixes = list(DEVICE_SAMPLES)
+    return {
+        f"bench{index:05d}{suffixes[index % len(suffixes)]}": DEVICE_SAMPLES[
+            suffixes[index % len(suffixes)]
+        ]
+        for index in range(count)
+    }
+
+@dataclass(eq=False)
+class _Session:
+    """一个客户端连接."""
+
+    client_id: str
+    writer: asyncio.StreamWriter
+    topics: set[str] = field(default_factory=set)
+
+    def send(self, data: bytes) -> None:
+        """发送报文."""
+        if not self.writer.is_closing():
+            self.writer.write(data)
+
+class BemfaEmulator:
+    """巴法云MQTT服务器与HTTP接口模拟器."""
+
+    def __init__(
+        self, topics: dict[str, str], echo_delay: float = 0.0, api_delay: float = 0.0
+    ) -> None:
+        """初始化模拟器, api_delay 用于模拟云端接口的响应延迟."""
+        self.messages = dict(topics)
+        self.echo_delay = echo_delay
+        self.api_delay = api_delay
+        self.published = 0
+        self.delivered = 0
+        self.sessions: dict[str, _Session] = {}
+        self._subscribers: dict[str, set[_Session]] = defaultdict(set)
+        self._servers: list = []
+        self._runner: web.AppRunner | None = None
+        self.mqtt_port = 0
+        self.http_port = 0
+
+    @property
+    def api_url(self) -> str:
+        """返回 alltopic 接口地址."""
+        return f"http://127.0.0.1:{self.http_port}/va/alltopic"
+
+    @property
+    def msg_api_url(self) -> str:
+        """返回 getmsg 接口地址."""
+        return f"http://127.0.0.1:{self.http_port}/va/getmsg"
+
+    async def start(self, mqtt_port: int = 0, http_port: int = 0) -> None:
+        """启动MQTT服务器和HTTP接口, 端口为 0 时随机分配."""
+        server = await asyncio.start_server(self._handle_client, "127.0.0.1", mqtt_port)
+        self._servers.append(server)
+        self.mqtt_port = server.sockets[0].getsockname()[1]
+
+        app = web.Application()
+        app.router.add_get("/va/alltopic", self._handle_alltopic)
+        app.router.add_get("/va/getmsg", self._handle_getmsg)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", http_port)
+        await site.start()
+        self.http_port = site._server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        """停止模拟器."""
+        for session in list(self.sessions.values()):
+            session.writer.close()
+        for server in self._servers:
+            server.close()
+            await server.wait_closed()
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    def publish(self, topic: str, payload: str, sender: _Session | None = None) -> None:
+        """按巴法云的规则发布消息.
+
+        发往 topic/set 的消息会更新 topic 的最新消息并推送给除发送者以外的订阅者,
+        发往 topic 的消息推送给所有订阅者.
+        """
+        self.published += 1
+        exclude = None
+        if topic.endswith(SET_SUFFIX):
+            topic = topic[: -len(SET_SUFFIX)]
+            exclude = sender
+        self.messages[topic] = payload
+
+        subscribers = self._subscribers.get(topic)
+        if not subscribers:
+            return
+        data = _packet(PUBLISH, 0, _encode_string(topic) + payload.encode())
+        for session in subscribers:
+            if session is not exclude:
+                session.send(data)
+                self.delivered += 1
+
+    def publish_burst(self, updates: dict[str, str]) -> None:
+        """一次发布多条设备上报消息."""
+        for topic, payload in updates.items():
+            self.publish(topic, payload)
+
+    async def _handle_alltopic(self, request: web.Request) -> web.Response:
+        """模拟 alltopic 接口."""
+        await asyncio.sleep(self.api_delay)
+        data = [
+            {"topic": topic, "msg": msg, "name": topic, "online": True}
+            for topic, msg in self.messages.items()
+        ]
+        return web.json_response({"code": 0, "message": "OK", "data": data})
+
+    async def _handle_getmsg(self, request: web.Request) -> web.Response:
+        """模拟 getmsg 接口."""
+        await asyncio.sleep(self.api_delay)
+        topic = request.query.get("topic", "")
+        if topic not in self.messages:
+            return web.json_response({"code": 40004, "message": "topic not found"})
+        return web.json_response({
+            "code": 0,
+            "data": [{"msg": self.messages[topic], "time": time.strftime("%Y-%m-%d %H:%M:%S")}],
+        })
+
+    async def _handle_client(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """处理一个MQTT客户端连接."""
+        session: _Session | None = None
+        try:
+            while True:
+                header = await reader.readexactly(1)
+                length, multiplier = 0, 1
+                while True:
+                    byte = (await reader.readexactly(1))[0]
+                    length += (byte & 0x7F) * multiplier
+                    multiplier *= 128
+                    if not byte & 0x80:
+                        break
+                body = await reader.readexactly(length)
+                packet_type, flags = header[0] >> 4, header[0] & 0x0F
+
+                if packet_type == CONNECT:
+                    session = self._handle_connect(body, writer)
+                elif session is None:
+                    break
+                elif packet_type == PUBLISH:
+                    self._handle_publish(session, flags, body)
+                elif packet_type == SUBSCRIBE:
+                    self._handle_subscribe(session, body)
+                elif packet_type == UNSUBSCRIBE:
+                    self._handle_unsubscribe(session, body)
+                elif packet_type == PINGREQ:
+                    session.send(_packet(PINGRESP, 0, b""))
+                elif packet_type == DISCONNECT:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            if session is not None:
+                self._drop_session(session)
+            writer.close()
+
+    def _handle_connect(self, body: bytes, writer: asyncio.StreamWriter) -> _Session:
+        """处理 CONNECT, 相同客户端ID的旧连接会被踢下线."""
+        name_length = struct.unpack_from("!H", body, 0)[0]
+        offset = 2 + name_length + 4
+        id_length = struct.unpack_from("!H", body, offset)[0]
+        client_id = body[offset + 2:offset + 2 + id_length].decode()
+
+        if (old := self.sessions.get(client_id)) is not None:
+            self._drop_session(old)
+            old.writer.close()
+
+        session = _Session(client_id, writer)
+        self.sessions[client_id] = session
+        session.send(_packet(CONNACK, 0, b"\x00\x00"))
+        return session
+
+    def _handle_publish(self, session: _Session, flags: int, body: bytes) -> None:
+        """处理 PUBLISH."""
+        qos = (flags >> 1) & 0x03
+        topic_length = struct.unpack_from("!H", body, 0)[0]
+        topic = body[2:2 + topic_length].decode()
+        offset = 2 + topic_length
+        if qos:
+            packet_id = body[offset:offset + 2]
+            offset += 2
+            session.send(_packet(PUBACK, 0, packet_id))
+        payload = body[offset:].decode()
+
+        self.publish(topic, payload, session)
+        if topic.endswith(SET_SUFFIX):
+            # 模拟设备执行命令后上报新状态
+            loop = asyncio.get_running_loop()
+            loop.call_later(
+                self.echo_delay, self.publish, topic[: -len(SET_SUFFIX)], payload
+            )
+
+    def _handle_subscribe(self, session: _Session, body: bytes) -> None:
+        """处理 SUBSCRIBE, 支持一个报文包含多个主题."""
+        packet_id = body[:2]
+        offset = 2
+        granted = bytearray()
+        while offset < len(body):
+            topic_length = struct.unpack_from("!H", body, offset)[0]
+            topic = body[offset + 2:offset + 2 + topic_length].decode()
+            offset += 2 + topic_length + 1
+            session.topics.add(topic)
+            self._subscribers[topic].add(session)
+            granted.append(0)
+        session.send(_packet(SUBACK, 0, packet_id + bytes(granted)))
+
+    def _handle_unsubscribe(self, session: _Session, body: bytes) -> None:
+        """处理 UNSUBSCRIBE."""
+        packet_id = body[:2]
+        offset = 2
+        while offset < len(body):
+            topic_length = struct.unpack_from("!H", body, offset)[0]
+            topic = body[offset + 2:offset + 2 + topic_length].decode()
+            offset += 2 + topic_length
+            session.topics.discard(topic)
+            self._subscribers[topic].discard(session)
+        session.send(_packet(UNSUBACK, 0, packet_id))
+
+    def _drop_session(self, session: _Session) -> None:
+        """移除连接的所有订阅."""
+        for topic in session.topics:
+            self._subscribers[topic].discard(session)
+        session.topics.clear()
+        if self.sessions.get(session.client_id) is session:
+            del self.sessions[session.client_id]
+
+async def _main() -> None:
+    """命令行入口."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--topics", type=int, default=100)
+    parser.add_argument("--mqtt-port", type=int, default=9501)
+    parser.add_argument("--http-port", type=int, default=8080)
+    parser.add_argument("--echo-delay", type=float, default=0.05)
+    parser.add_argument("--api-delay", type=float, default=0.0)
+    args = parser.parse_args()
+
+    emulator = BemfaEmulator(
+        synthetic_topics(args.topics), args.echo_delay, args.api_delay
+    )
+    await emulator.start(args.mqtt_port, args.http_port)
+    print(json.dumps({
+        "mqtt": f"127.0.0.1:{emulator.mqtt_port}",
+        "alltopic": emulator.api_url,
+        "getmsg": emulator.msg_api_url,
+        "topics": args.topics,
+    }))
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await emulator.stop()
+
+if __name__ == "__main__":
+    asyncio.run(_main())
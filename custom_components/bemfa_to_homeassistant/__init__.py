@@ -3,115 +3,223 @@ from __future__ import annotations
 
 import asyncio
 import logging
-from datetime import timedelta
-
-import async_timeout
-import requests
-import paho.mqtt.client as mqtt
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass
+from functools import partial
+from time import monotonic
+from typing import Any
 
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
+from homeassistant.const import Platform
+from homeassistant.core import CALLBACK_TYPE, HassJob, HomeAssistant, callback
 from homeassistant.exceptions import ConfigEntryNotReady
+from homeassistant.helpers import config_validation as cv
+from homeassistant.helpers import device_registry as dr
+from homeassistant.helpers.device_registry import DeviceEntry, DeviceInfo
+from homeassistant.helpers.event import async_call_later
 from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
 
 from .const import (
     DOMAIN,
     CONF_API_KEY,
-    BEMFA_API_URL,
-    DEFAULT_SCAN_INTERVAL,
     DEVICE_TYPES,
     PLATFORMS,
-    MQTT_HOST,
-    MQTT_PORT,
-    MQTT_KEEPALIVE,
-    TOPIC_PING,
-    INTERVAL_PING_SEND,
+    CONF_INBOX_WINDOW,
+    DEFAULT_INBOX_WINDOW,
+    CONF_TRANSPORT,
+    DEFAULT_TRANSPORT,
+    CONF_COMMAND_TIMEOUT,
+    DEFAULT_COMMAND_TIMEOUT,
+    CONF_MQTT_SHARDS,
+    DEFAULT_MQTT_SHARDS,
+    CONF_PERF_SENSORS,
+    DEFAULT_PERF_SENSORS,
+    CONF_COMMAND_QOS,
+    DEFAULT_COMMAND_QOS,
+    RECONNECT_BASE_DELAY,
+    RECONNECT_MAX_DELAY,
+    TOPIC_REMOVE_AFTER,
 )
+from .api import BemfaApiClient, BemfaApiError
+from .cache import BemfaDeviceCache
+from .codec import decode
+from .connection import async_get_connection, async_release_connection
+from .helpers import BemfaDeviceInfo, BemfaDeviceStore, get_device_info
+from .inbox import BemfaInbox
+from .metrics import BemfaMetrics
+from .scheduler import BemfaPollScheduler
+from .services import async_setup_services
 
 _LOGGER = logging.getLogger(__name__)
 
+CONFIG_SCHEMA = cv.config_entry_only_config_schema(DOMAIN)
+
+async def async_setup(hass: HomeAssistant, config: dict) -> bool:
+    """注册巴法云集成的服务."""
+    async_setup_services(hass)
+    return True
+
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """设置巴法云集成."""
     hass.data.setdefault(DOMAIN, {})
     
+    cache = BemfaDeviceCache(hass, entry.entry_id)
     coordinator = BemfaDataUpdateCoordinator(
         hass,
         _LOGGER,
         entry.data[CONF_API_KEY],
         name="bemfa_devices",
-        update_interval=timedelta(seconds=DEFAULT_SCAN_INTERVAL),
+        command_timeout=entry.options.get(
+            CONF_COMMAND_TIMEOUT, DEFAULT_COMMAND_TIMEOUT
+        ),
+        cache=cache,
     )
 
-    try:
-        await coordinator.async_config_entry_first_refresh()
-    except Exception as err:
-        raise ConfigEntryNotReady from err
+    # 有缓存时先用缓存创建实体, 轮询和MQTT连接放到后台, 启动不再依赖云端
+    warm_start = bool(cached := await cache.async_load())
+    if warm_start:
+        coordinator.async_set_cached_devices(cached)
 
-    def on_connect(client, userdata, flags, rc):
-        """MQTT连接回调."""
-        if rc == 0:
-            client.subscribe(TOPIC_PING)
-            for topic in coordinator.data:
-                client.subscribe(topic)
+    # 冷启动时设备列表加载前收件箱处于暂停状态, 只收集消息不处理
+    inbox = BemfaInbox(
+        hass,
+        coordinator.async_set_topics_data,
+        window=entry.options.get(CONF_INBOX_WINDOW, DEFAULT_INBOX_WINDOW) / 1000,
+        metrics=coordinator.metrics,
+        paused=not warm_start,
+    )
+    count_message = coordinator.metrics.count_message
 
-    def on_message(client, userdata, msg):
-        """MQTT消息回调."""
-        try:
-            topic = msg.topic
-            payload = msg.payload.decode()
-            
-            if topic == TOPIC_PING:
-                coordinator._ping_lost = 0
-                return
-            
-            if topic in coordinator.data:
-                coordinator.data[topic].update({
-                    "state": payload,
-                    "online": True
-                })
-                hass.loop.call_soon_threadsafe(
-                    coordinator.async_set_updated_data, 
-                    coordinator.data.copy()
-                )
-        except Exception as err:
-            _LOGGER.error("处理MQTT消息错误: %s", err)
+    def on_message(topic: str, payload: str) -> None:
+        """MQTT消息回调, 每个分片的MQTT线程都会调用."""
+        if (data := coordinator.data) is None:
+            inbox.put(topic, payload)
+        elif (device := data.get(topic)) is not None:
+            count_message(device.type)
+            inbox.put(topic, payload)
 
-    mqtt_client = mqtt.Client(client_id=entry.data[CONF_API_KEY])
-    mqtt_client.on_connect = on_connect
-    mqtt_client.on_message = on_message
+    # 同一个 uid 的多个配置条目共享一组连接
+    mqtt_client = async_get_connection(
+        hass,
+        entry.data[CONF_API_KEY],
+        mode=entry.options.get(CONF_TRANSPORT, DEFAULT_TRANSPORT),
+        shards=entry.options.get(CONF_MQTT_SHARDS, DEFAULT_MQTT_SHARDS),
+        command_qos=entry.options.get(CONF_COMMAND_QOS, DEFAULT_COMMAND_QOS),
+    )
+    heartbeat = mqtt_client.heartbeat
+    remove_handler = mqtt_client.async_add_message_handler(on_message)
+    mqtt_client.async_subscribe(set(coordinator.data or ()))
 
-    try:
-        mqtt_client.connect(MQTT_HOST, MQTT_PORT, MQTT_KEEPALIVE)
-        mqtt_client.loop_start()
-        
-        async def send_ping():
-            while True:
-                mqtt_client.publish(TOPIC_PING, "ping")
-                await asyncio.sleep(INTERVAL_PING_SEND)
-        
-        hass.loop.create_task(send_ping())
-        
-    except Exception as err:
-        raise ConfigEntryNotReady("MQTT连接失败") from err
+    @callback
+    def on_devices_changed(added: set[str], removed: set[str]) -> None:
+        """设备列表变化时只订阅新增的主题, 取消订阅移除的主题."""
+        mqtt_client.async_subscribe(added)
+        mqtt_client.async_unsubscribe(removed)
+
+    entry.async_on_unload(coordinator.async_add_device_listener(on_devices_changed))
+
+    if not warm_start:
+        # REST 首次刷新与MQTT连接同时进行, 启动耗时取两者中较慢的一个
+        refresh, connect = await asyncio.gather(
+            coordinator.async_config_entry_first_refresh(),
+            mqtt_client.async_connect(),
+            return_exceptions=True,
+        )
+        if isinstance(refresh, BaseException) or isinstance(connect, BaseException):
+            remove_handler()
+            inbox.async_stop()
+            await async_release_connection(hass, entry.data[CONF_API_KEY])
+            if isinstance(refresh, BaseException):
+                raise ConfigEntryNotReady from refresh
+            raise ConfigEntryNotReady("MQTT连接失败") from connect
+        inbox.async_resume()
+    entry.async_on_unload(remove_handler)
+
+    @callback
+    def on_heartbeat() -> None:
+        """心跳状态变化时调整轮询间隔."""
+        coordinator.async_update_push_health(heartbeat.healthy)
+
+    entry.async_on_unload(heartbeat.async_add_listener(on_heartbeat))
+    if heartbeat.healthy:
+        on_heartbeat()
+    # 心跳和看门狗由共享连接统一运行, 链路恢复后每个配置条目各同步一次
+    entry.async_on_unload(
+        mqtt_client.async_add_resync_handler(coordinator.async_request_refresh)
+    )
+    if warm_start:
+        entry.async_create_background_task(
+            hass, coordinator.async_refresh(), "bemfa_refresh"
+        )
+        entry.async_create_background_task(
+            hass, _async_warm_connect(mqtt_client), "bemfa_connect"
+        )
 
     hass.data[DOMAIN][entry.entry_id] = {
         "coordinator": coordinator,
         "mqtt_client": mqtt_client,
+        "inbox": inbox,
+        "heartbeat": heartbeat,
+        "watchdog": mqtt_client.watchdog,
     }
 
-    await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
+    # 只加载账号中实际存在的设备类型的平台, 性能传感器挂在传感器平台下
+    await coordinator.async_forward_platforms(
+        (Platform.SENSOR,)
+        if entry.options.get(CONF_PERF_SENSORS, DEFAULT_PERF_SENSORS)
+        else ()
+    )
+    coordinator.async_watch_stale_devices()
+    entry.async_on_unload(entry.add_update_listener(async_reload_entry))
     return True
 
+async def _async_warm_connect(mqtt_client) -> None:
+    """热启动后在后台连接MQTT, 失败时按指数退避重试."""
+    delay = RECONNECT_BASE_DELAY
+    while True:
+        try:
+            await mqtt_client.async_connect()
+            return
+        except Exception as err:
+            _LOGGER.warning("MQTT连接失败, %d 秒后重试: %s", delay, err)
+            await asyncio.sleep(delay)
+            delay = min(RECONNECT_MAX_DELAY, delay * 2)
+
+async def async_reload_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """选项变化后重新加载集成."""
+    await hass.config_entries.async_reload(entry.entry_id)
+
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """卸载巴法云集成."""
-    unload_ok = await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
+    coordinator = hass.data[DOMAIN][entry.entry_id]["coordinator"]
+    unload_ok = await hass.config_entries.async_unload_platforms(
+        entry, coordinator.platforms or ()
+    )
     if unload_ok:
-        mqtt_client = hass.data[DOMAIN][entry.entry_id]["mqtt_client"]
-        mqtt_client.loop_stop()
-        mqtt_client.disconnect()
+        await async_release_connection(hass, entry.data[CONF_API_KEY])
+        hass.data[DOMAIN][entry.entry_id]["inbox"].async_stop()
+        coordinator.async_cancel_commands()
         hass.data[DOMAIN].pop(entry.entry_id)
     return unload_ok
 
+async def async_remove_config_entry_device(
+    hass: HomeAssistant, entry: ConfigEntry, device_entry: DeviceEntry
+) -> bool:
+    """只允许手动删除已经不在巴法云设备列表中的设备."""
+    coordinator = hass.data[DOMAIN][entry.entry_id]["coordinator"]
+    return not coordinator.is_known_device(device_entry)
+
+async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """删除集成时清除设备缓存."""
+    await BemfaDeviceCache(hass, entry.entry_id).async_remove()
+
+@dataclass(slots=True)
+class _PendingCommand:
+    """一条等待设备回显确认的命令, 超时计时在命令发布后才开始."""
+    payload: str
+    state: Any
+    cancel: CALLBACK_TYPE | None = None
+
 class BemfaDataUpdateCoordinator(DataUpdateCoordinator):
     """处理巴法云数据更新的类."""
 
@@ -121,63 +229,376 @@ class BemfaDataUpdateCoordinator(DataUpdateCoordinator):
         logger: logging.Logger,
         api_key: str,
         name: str,
-        update_interval: timedelta,
+        command_timeout: float = DEFAULT_COMMAND_TIMEOUT,
+        cache: BemfaDeviceCache | None = None,
     ) -> None:
         """初始化."""
+        self.scheduler = BemfaPollScheduler()
         super().__init__(
             hass,
             logger,
             name=name,
-            update_interval=update_interval,
+            update_interval=self.scheduler.update_interval,
+            always_update=False,
         )
         self.api_key = api_key
-        self._devices = {}
-        self._ping_lost = 0
+        self.api = BemfaApiClient(hass, api_key)
+        self.store = BemfaDeviceStore()
+        self.metrics = BemfaMetrics()
+        self._cache = cache
+        self.platforms: set[Platform] | None = None
+        self._forwarding: set[Platform] = set()
+        self._device_info: dict[str, DeviceInfo] = {}
+        self._topic_listeners: dict[str, list[CALLBACK_TYPE]] = {}
+        self._device_listeners: list[Callable[[set[str], set[str]], None]] = []
+        self._command_timeout = command_timeout
+        self._pending_commands: dict[str, _PendingCommand] = {}
+        self.last_poll_changed = 0
+        self.last_poll_unchanged = 0
+
+    @callback
+    def async_update_push_health(self, healthy: bool) -> None:
+        """根据MQTT心跳状态调整轮询间隔, 推送异常时立即轮询一次."""
+        if healthy == self.scheduler.push_healthy:
+            return
+
+        self.scheduler.push_healthy = healthy
+        self.update_interval = self.scheduler.update_interval
+        if not healthy:
+            self.hass.async_create_task(self.async_request_refresh())
+
+    @callback
+    def async_set_cached_devices(self, devices: list[BemfaDeviceInfo]) -> None:
+        """用缓存的设备列表作为初始数据, 之后的轮询只通知与缓存不同的主题."""
+        self.store.replace(devices)
+        self.store.pop_changed()
+        self.store.pop_topic_changes()
+        self.data = self.store
+
+    async def async_forward_platforms(
+        self, extra: Iterable[Platform] = (), late: bool = False
+    ) -> None:
+        """转发尚未加载的设备类型对应的平台, late 表示在集成设置完成之后转发.
+
+        平台转发成功后才记录到 platforms 中, 卸载时不会卸载没有加载的平台;
+        正在转发的平台单独记录, 并发的轮询不会重复转发同一个平台.
+        """
+        new = {Platform(device.type) for device in self.store.values()}
+        new.update(extra)
+        new -= (self.platforms or set()) | self._forwarding
+        if not new:
+            if self.platforms is None:
+                self.platforms = set()
+            return
+
+        config_entries = self.hass.config_entries
+        # 新版本的 Home Assistant 要求在设置之外用 async_late_forward_entry_setups 转发
+        forward = (
+            config_entries.async_late_forward_entry_setups
+            if late and hasattr(config_entries, "async_late_forward_entry_setups")
+            else config_entries.async_forward_entry_setups
+        )
+        self._forwarding |= new
+        try:
+            await forward(
+                self.config_entry,
+                [platform for platform in PLATFORMS if platform in new],
+            )
+        finally:
+            self._forwarding -= new
+        self.platforms = (self.platforms or set()) | new
+
+    @callback
+    def get_device_info(self, topic: str) -> DeviceInfo:
+        """返回主题的设备信息, 同一主题的所有实体共享同一个对象."""
+        name = self.store[topic].name
+        device_info = self._device_info.get(topic)
+        if device_info is None or device_info["name"] != name:
+            device_info = self._device_info[topic] = get_device_info(topic, name)
+        return device_info
+
+    @callback
+    def is_known_device(self, device: DeviceEntry) -> bool:
+        """判断设备注册表中的设备是否仍然存在于设备列表中."""
+        if self.config_entry.options.get(CONF_PERF_SENSORS, DEFAULT_PERF_SENSORS):
+            known = (DOMAIN, self.config_entry.entry_id)
+            if known in device.identifiers:
+                return True
+        return any(
+            domain == DOMAIN and topic in self.store
+            for domain, topic in device.identifiers
+        )
+
+    @callback
+    def async_watch_stale_devices(self) -> None:
+        """登记设备注册表中已经不在设备列表中的设备.
+
+        启动时的设备列表可能只来自一次轮询或缓存, 不能据此立即移除; 交给存储按
+        TOPIC_REMOVE_AFTER 次成功轮询计数, 确认缺失后与运行中移除的主题一样处理.
+        """
+        registry = dr.async_get(self.hass)
+        self.store.watch_absent(
+            topic
+            for device in dr.async_entries_for_config_entry(
+                registry, self.config_entry.entry_id
+            )
+            if not self.is_known_device(device)
+            for domain, topic in device.identifiers
+            if domain == DOMAIN
+        )
+
+    @callback
+    def async_add_device_listener(
+        self, update_callback: Callable[[set[str], set[str]], None]
+    ) -> CALLBACK_TYPE:
+        """注册设备增减监听器, 参数为新增和移除的主题集合."""
+        self._device_listeners.append(update_callback)
+
+        @callback
+        def remove_listener() -> None:
+            """移除设备增减监听器."""
+            self._device_listeners.remove(update_callback)
+
+        return remove_listener
+
+    @callback
+    def _async_dispatch_topic_changes(self) -> None:
+        """通知新增和移除的主题, 并同步设备注册表中移除和改名的设备."""
+        added, removed, renamed = self.store.pop_topic_changes()
+        if not (added or removed or renamed):
+            return
+
+        _LOGGER.debug(
+            "设备列表变化: 新增 %d 个, 移除 %d 个, 改名 %d 个",
+            len(added),
+            len(removed),
+            len(renamed),
+        )
+        for topic in removed:
+            self._async_cancel_command(topic)
+            self._device_info.pop(topic, None)
+        if added or removed:
+            for update_callback in list(self._device_listeners):
+                update_callback(added, removed)
+        if not (removed or renamed):
+            return
+
+        registry = dr.async_get(self.hass)
+        entry_id = self.config_entry.entry_id
+        for topic in removed:
+            if device := registry.async_get_device(identifiers={(DOMAIN, topic)}):
+                registry.async_update_device(device.id, remove_config_entry_id=entry_id)
+        for topic in renamed:
+            if device := registry.async_get_device(identifiers={(DOMAIN, topic)}):
+                registry.async_update_device(device.id, name=self.store[topic].name)
+
+    @callback
+    def async_add_topic_listener(
+        self, topic: str, update_callback: CALLBACK_TYPE
+    ) -> CALLBACK_TYPE:
+        """注册单个主题的监听器, MQTT消息只唤醒绑定该主题的实体."""
+        listeners = self._topic_listeners.setdefault(topic, [])
+        listeners.append(update_callback)
+
+        @callback
+        def remove_listener() -> None:
+            """移除主题监听器."""
+            listeners.remove(update_callback)
+            if not listeners and self._topic_listeners.get(topic) is listeners:
+                del self._topic_listeners[topic]
+
+        return remove_listener
+
+    @callback
+    def async_set_topics_data(self, updates: dict[str, str]) -> None:
+        """批量更新多个主题的状态, 只在最后统一通知一次."""
+        changed = False
+        for topic, payload in updates.items():
+            if self.store.update_state(topic, payload):
+                changed = True
+            elif topic in self._pending_commands and self._async_confirm_command(topic):
+                # 回显与存储一致时实体仍显示乐观状态, 需要重新同步
+                self._async_notify_topic(topic)
+        if changed:
+            self._async_dispatch_changed()
+
+    @callback
+    def async_apply_commands(self, commands: dict[str, str]) -> dict[str, CALLBACK_TYPE]:
+        """登记一批命令并让实体显示乐观状态, 返回每个主题在命令发布后调用的回调.
+
+        乐观状态只保存在等待中的命令上, 不写入存储, 也不会进入缓存.
+        """
+        published = {
+            topic: self.async_track_command(topic, command)
+            for topic, command in commands.items()
+        }
+        for topic in commands:
+            self._async_notify_topic(topic)
+        return published
+
+    @callback
+    def get_state(self, topic: str) -> str:
+        """返回实体应显示的状态, 有等待确认的命令时为命令的乐观状态."""
+        if (pending := self._pending_commands.get(topic)) is not None:
+            return pending.payload
+        device = self.store.get(topic)
+        return device.state if device is not None else ""
+
+    @callback
+    def _async_dispatch_changed(self) -> None:
+        """通知所有发生变化的主题的监听器, 并安排更新缓存."""
+        changed = self.store.pop_changed()
+        for topic in changed:
+            # 与等待中的命令不一致的消息(如上一条命令的回显)不覆盖乐观状态
+            if self._async_confirm_command(topic):
+                self._async_notify_topic(topic)
+        if changed and self._cache is not None:
+            self._cache.async_schedule_save(self.store)
+
+    @callback
+    def _async_notify_topic(self, topic: str) -> None:
+        """通知单个主题的监听器."""
+        for update_callback in list(self._topic_listeners.get(topic, ())):
+            update_callback()
+
+    @callback
+    def async_track_command(self, topic: str, command: str) -> CALLBACK_TYPE:
+        """等待设备回显与命令一致的状态, 返回命令发布后调用的回调.
+
+        超时从命令真正发布时开始计算, 超时后只查询该主题的最新消息.
+        """
+        self._async_cancel_command(topic)
+        device = self.store.get(topic)
+        pending = _PendingCommand(
+            command, decode(device.type, command) if device else command
+        )
+        self._pending_commands[topic] = pending
+
+        @callback
+        def async_published() -> None:
+            """命令已发布, 开始等待回显."""
+            if self._pending_commands.get(topic) is pending and pending.cancel is None:
+                pending.cancel = async_call_later(
+                    self.hass,
+                    self._command_timeout,
+                    HassJob(partial(self._async_command_timeout, topic)),
+                )
+
+        return async_published
+
+    @callback
+    def _async_confirm_command(self, topic: str) -> bool:
+        """收到主题消息后判断是否通知监听器.
+
+        没有等待中的命令, 或消息解析后与等待中的命令一致时返回 True, 并结束等待;
+        与命令不一致时返回 False, 继续等待回显或超时.
+        """
+        if (pending := self._pending_commands.get(topic)) is None:
+            return True
+        if (device := self.store.get(topic)) is not None and decode(
+            device.type, device.state
+        ) != pending.state:
+            return False
+        self._async_cancel_command(topic)
+        return True
+
+    @callback
+    def _async_cancel_command(self, topic: str) -> None:
+        """结束主题的命令等待."""
+        if (pending := self._pending_commands.pop(topic, None)) is not None:
+            if pending.cancel is not None:
+                pending.cancel()
+
+    async def _async_command_timeout(self, topic: str, _now) -> None:
+        """命令确认超时, 查询该主题的最新消息."""
+        self._pending_commands.pop(topic, None)
+        await self.async_refresh_topic(topic)
+
+    async def async_refresh_topic(self, topic: str) -> None:
+        """从巴法云获取单个主题的最新消息, 无论查询是否成功都通知其监听器."""
+        changed = False
+        try:
+            if (state := await self.api.async_get_topic_msg(topic)) is not None:
+                changed = self.store.update_state(topic, state)
+        except BemfaApiError as err:
+            _LOGGER.debug("获取主题 %s 的消息失败: %s", topic, err)
+        finally:
+            if changed:
+                self._async_dispatch_changed()
+            elif topic not in self._pending_commands:
+                # 状态未变化或查询失败时实体可能仍显示乐观状态, 按存储重新同步;
+                # 期间又发出了新命令时保留新命令的乐观状态
+                self._async_notify_topic(topic)
+
+    @callback
+    def async_cancel_commands(self) -> None:
+        """取消所有等待中的命令确认."""
+        for pending in self._pending_commands.values():
+            if pending.cancel is not None:
+                pending.cancel()
+        self._pending_commands.clear()
 
     async def _async_update_data(self):
         """获取最新的设备数据."""
+        self.metrics.polls += 1
+        start = monotonic()
         try:
-            async with async_timeout.timeout(10):
-                return await self._fetch_devices()
+            async with asyncio.timeout(10):
+                data = await self._fetch_devices()
+            self.metrics.last_poll_success = monotonic()
+            return data
         except Exception as err:
+            self.metrics.poll_failures += 1
             raise UpdateFailed(f"更新失败: {err}") from err
+        finally:
+            self.metrics.poll_duration.record(monotonic() - start)
 
     async def _fetch_devices(self):
         """从巴法云获取设备列表."""
         try:
-            response = await self.hass.async_add_executor_job(
-                self._get_devices
-            )
+            response = await self.api.async_get_all_topics()
+            # 巴法云的错误(如 uid 无效, 限流)也以 HTTP 200 返回, 不能当作设备全部移除
+            if response.get("code") != 0 or not isinstance(
+                data := response.get("data"), list
+            ):
+                raise UpdateFailed(
+                    f"获取设备列表失败: {response.get('code')} {response.get('message')}"
+                )
             
-            devices = {}
-            for device in response.get("data", []):
+            start = monotonic()
+            devices = []
+            for device in data:
                 topic = device.get("topic", "")
                 device_type = self._get_device_type(topic)
                 
                 if device_type:
-                    devices[topic] = {
-                        "topic": topic,
-                        "name": device.get("name", topic),
-                        "type": device_type,
-                        "state": device.get("msg", ""),
-                        "online": True,
-                    }
+                    devices.append(BemfaDeviceInfo(
+                        topic=topic,
+                        name=device.get("name", topic),
+                        type=device_type,
+                        state=device.get("msg", ""),
+                    ))
             
-            self._devices = devices
-            return devices
+            # 只通知内容发生变化的主题, 返回同一个存储对象使协调器不再广播
+            changed = self.store.replace(devices, TOPIC_REMOVE_AFTER)
+            self.metrics.parse_time.record(monotonic() - start)
+            self.last_poll_changed = len(changed)
+            self.last_poll_unchanged = len(devices) - len(changed & self.store.keys())
+            _LOGGER.debug(
+                "轮询完成: %d 个主题变化, %d 个主题未变化",
+                self.last_poll_changed,
+                self.last_poll_unchanged,
+            )
+            self._async_dispatch_changed()
+            self._async_dispatch_topic_changes()
+            if self.platforms is not None and not {
+                device.type for device in devices
+            } <= self.platforms:
+                self.hass.async_create_task(self.async_forward_platforms(late=True))
+            return self.store
             
-        except requests.RequestException as err:
-            raise UpdateFailed("无法连接到巴法云服务器") from err
-
-    def _get_devices(self):
-        """执行API请求获取设备列表."""
-        response = requests.get(
-            BEMFA_API_URL,
-            params={"uid": self.api_key, "type": "1"},
-            timeout=10,
-        )
-        response.raise_for_status()
-        return response.json()
+        except BemfaApiError as err:
+            raise UpdateFailed(str(err)) from err
 
     @staticmethod
     def _get_device_type(topic: str) -> str | None:
@@ -201,4 +622,4 @@ class BemfaDataUpdateCoordinator(DataUpdateCoordinator):
 
     def get_device(self, topic: str):
         """获取指定主题的设备信息."""
-        return self._devices.get(topic)
+        return self.store.get(topic)
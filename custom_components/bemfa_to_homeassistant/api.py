@@ -0,0 +1,124 @@
+"""巴法云REST API客户端."""
+from __future__ import annotations
+
+import asyncio
+import logging
+from time import monotonic
+from typing import Any
+
+import aiohttp
+
+from homeassistant.core import HomeAssistant
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+
+from .const import (
+    BEMFA_API_URL,
+    BEMFA_MSG_API_URL,
+    DATA_RATE_LIMITER,
+    API_TIMEOUT,
+    API_RATE,
+    API_BURST,
+    API_RETRY_AFTER,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+class BemfaApiError(HomeAssistantError):
+    """表示巴法云API请求失败的错误."""
+
+class BemfaRateLimited(BemfaApiError):
+    """表示巴法云API限流的错误."""
+
+class BemfaTokenBucket:
+    """令牌桶限速器, 由同一个Home Assistant实例中的所有请求共享."""
+
+    def __init__(self, rate: float, burst: int) -> None:
+        """初始化令牌桶."""
+        self._rate = rate
+        self._burst = burst
+        self._tokens = float(burst)
+        self._updated = monotonic()
+        self._paused_until = 0.0
+
+    async def async_acquire(self) -> None:
+        """获取一个令牌, 令牌不足或被限流时等待."""
+        while (delay := self.try_acquire()) > 0:
+            await asyncio.sleep(delay)
+
+    def try_acquire(self) -> float:
+        """尝试获取一个令牌, 成功时返回 0, 否则返回需要等待的秒数."""
+        now = monotonic()
+        if now < self._paused_until:
+            return self._paused_until - now
+
+        self._tokens = min(
+            self._burst, self._tokens + (now - self._updated) * self._rate
+        )
+        self._updated = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0
+        return (1 - self._tokens) / self._rate
+
+    def pause(self, seconds: float) -> None:
+        """服务器限流时暂停发放令牌."""
+        self._paused_until = max(self._paused_until, monotonic() + seconds)
+
+def async_get_rate_limiter(hass: HomeAssistant) -> BemfaTokenBucket:
+    """获取共享的令牌桶."""
+    if (limiter := hass.data.get(DATA_RATE_LIMITER)) is None:
+        limiter = hass.data[DATA_RATE_LIMITER] = BemfaTokenBucket(API_RATE, API_BURST)
+    return limiter
+
+class BemfaApiClient:
+    """巴法云REST API客户端, 复用Home Assistant的连接池."""
+
+    def __init__(self, hass: HomeAssistant, api_key: str) -> None:
+        """初始化API客户端."""
+        self._session = async_get_clientsession(hass)
+        self._limiter = async_get_rate_limiter(hass)
+        self._api_key = api_key
+
+    async def async_get_all_topics(self) -> dict[str, Any]:
+        """获取所有主题及其最新消息."""
+        return await self._async_request(
+            BEMFA_API_URL, {"uid": self._api_key, "type": "1"}
+        )
+
+    async def async_get_topic_msg(self, topic: str) -> str | None:
+        """获取单个主题的最新消息."""
+        response = await self._async_request(
+            BEMFA_MSG_API_URL, {"uid": self._api_key, "topic": topic, "type": "1"}
+        )
+        data = response.get("data")
+        if isinstance(data, list):
+            data = data[0] if data else None
+        if not isinstance(data, dict):
+            return None
+        return data.get("msg")
+
+    async def _async_request(self, url: str, params: dict[str, str]) -> dict[str, Any]:
+        """执行限速后的GET请求."""
+        await self._limiter.async_acquire()
+        try:
+            async with self._session.get(
+                url,
+                params=params,
+                timeout=aiohttp.ClientTimeout(total=API_TIMEOUT),
+            ) as response:
+                if response.status in (429, 503):
+                    retry_after = _parse_retry_after(response.headers.get("Retry-After"))
+                    self._limiter.pause(retry_after)
+                    raise BemfaRateLimited(f"巴法云API限流, {retry_after}秒后重试")
+                response.raise_for_status()
+                return await response.json(content_type=None)
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as err:
+            raise BemfaApiError(f"无法连接到巴法云服务器: {err}") from err
+
+def _parse_retry_after(value: str | None) -> float:
+    """解析 Retry-After 头."""
+    try:
+        return max(1.0, float(value))
+    except (TypeError, ValueError):
+        return API_RETRY_AFTER
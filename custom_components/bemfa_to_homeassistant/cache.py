@@ -0,0 +1,82 @@
+"""巴法云设备列表缓存."""
+from __future__ import annotations
+
+import logging
+from typing import Any
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.storage import Store
+
+from .const import DOMAIN, CACHE_STORAGE_VERSION, CACHE_SAVE_DELAY
+from .helpers import BemfaDeviceInfo, BemfaDeviceStore
+
+_LOGGER = logging.getLogger(__name__)
+
+class BemfaDeviceCache:
+    """把最近一次的设备列表和消息保存到 .storage, 用于重启后立即创建实体.
+
+    写入通过 Store.async_delay_save 延迟合并, 一个延迟周期内无论有多少变化都只写一次.
+    """
+
+    def __init__(self, hass: HomeAssistant, entry_id: str) -> None:
+        """初始化缓存."""
+        self._store: Store[dict[str, Any]] = Store(
+            hass, CACHE_STORAGE_VERSION, f"{DOMAIN}.{entry_id}.devices"
+        )
+        self._devices: BemfaDeviceStore | None = None
+        self._save_pending = False
+
+    async def async_load(self) -> list[BemfaDeviceInfo]:
+        """读取缓存的设备列表, 没有缓存时返回空列表."""
+        try:
+            data = await self._store.async_load()
+        except Exception as err:
+            _LOGGER.warning("读取设备缓存失败: %s", err)
+            return []
+        if not data:
+            return []
+
+        devices = []
+        for item in data.get("devices", []):
+            try:
+                devices.append(BemfaDeviceInfo(
+                    topic=item["topic"],
+                    name=item["name"],
+                    type=item["type"],
+                    state=item.get("state", ""),
+                    online=item.get("online", True),
+                ))
+            except (KeyError, TypeError):
+                continue
+        return devices
+
+    @callback
+    def async_schedule_save(self, devices: BemfaDeviceStore) -> None:
+        """安排一次延迟写入, 已有等待中的写入时不重复安排."""
+        self._devices = devices
+        if self._save_pending:
+            return
+        self._save_pending = True
+        self._store.async_delay_save(self._data_to_save, CACHE_SAVE_DELAY)
+
+    @callback
+    def _data_to_save(self) -> dict[str, Any]:
+        """生成要写入的数据."""
+        self._save_pending = False
+        devices = self._devices.values() if self._devices is not None else ()
+        return {
+            "devices": [
+                {
+                    "topic": device.topic,
+                    "name": device.name,
+                    "type": device.type,
+                    "state": device.state,
+                    "online": device.online,
+                }
+                for device in devices
+            ]
+        }
+
+    async def async_remove(self) -> None:
+        """删除缓存文件."""
+        await self._store.async_remove()
@@ -9,66 +9,37 @@ from homeassistant.components.climate import (
     ClimateEntityFeature,
     HVACMode,
     FAN_AUTO,
-    FAN_LOW,
-    FAN_MEDIUM,
-    FAN_HIGH,
     SWING_OFF,
-    SWING_BOTH,
-    SWING_HORIZONTAL,
-    SWING_VERTICAL,
 )
 from homeassistant.const import (
     ATTR_TEMPERATURE,
     UnitOfTemperature,
 )
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 from homeassistant.helpers.update_coordinator import CoordinatorEntity
 
+from .codec import (
+    MIN_TEMP,
+    MAX_TEMP,
+    FAN_MODES,
+    FAN_MODES_REVERSE,
+    HVAC_MODES,
+    HVAC_MODES_REVERSE,
+    SWING_MODES,
+    SWING_MODES_REVERSE,
+    decode,
+    encode_climate,
+)
 from .const import (
     DOMAIN,
     CONF_API_KEY,
-    MSG_ON,
-    MSG_OFF,
-    MSG_SEPARATOR,
 )
 from .helpers import BemfaBaseEntity
 
 _LOGGER = logging.getLogger(__name__)
 
-# 空调模式映射
-HVAC_MODES = {
-    "1": HVACMode.AUTO,
-    "2": HVACMode.COOL,
-    "3": HVACMode.HEAT,
-    "4": HVACMode.FAN_ONLY,
-    "5": HVACMode.DRY,
-}
-HVAC_MODES_REVERSE = {v: k for k, v in HVAC_MODES.items()}
-
-# 风速映射
-FAN_MODES = {
-    "0": FAN_AUTO,
-    "1": FAN_LOW,
-    "2": FAN_MEDIUM,
-    "3": FAN_HIGH,
-}
-FAN_MODES_REVERSE = {v: k for k, v in FAN_MODES.items()}
-
-# 扫风映射
-SWING_MODES = {
-    "0#0": SWING_OFF,
-    "1#0": SWING_HORIZONTAL,
-    "0#1": SWING_VERTICAL,
-    "1#1": SWING_BOTH,
-}
-SWING_MODES_REVERSE = {v: k for k, v in SWING_MODES.items()}
-
-# 温度范围
-MIN_TEMP = 16
-MAX_TEMP = 32
-
 async def async_setup_entry(
     hass: HomeAssistant,
     entry: ConfigEntry,
@@ -78,21 +49,32 @@ async def async_setup_entry(
     coordinator = hass.data[DOMAIN][entry.entry_id]["coordinator"]
     mqtt_client = hass.data[DOMAIN][entry.entry_id]["mqtt_client"]
     
-    entities = [
-        BemfaClimate(coordinator, mqtt_client, topic, entry)
-        for topic, device in coordinator.data.items()
-        if device["type"] == "climate"
-    ]
-    
-    if entities:
-        async_add_entities(entities)
+    @callback
+    def async_add_devices(added: set[str], removed: set[str]) -> None:
+        """为新增的主题创建空调实体, 移除的主题由设备注册表清理."""
+        entities = [
+            BemfaClimate(coordinator, mqtt_client, topic, entry)
+            for topic in added
+            if coordinator.data[topic].type == "climate"
+        ]
+        if entities:
+            async_add_entities(entities)
+
+    async_add_devices(coordinator.data.keys(), set())
+    entry.async_on_unload(coordinator.async_add_device_listener(async_add_devices))
 
 class BemfaClimate(CoordinatorEntity, BemfaBaseEntity, ClimateEntity):
     """巴法云空调设备."""
 
+    _state_attrs = (
+        "_attr_hvac_mode",
+        "_attr_target_temperature",
+        "_attr_fan_mode",
+        "_attr_swing_mode",
+    )
     _attr_has_entity_name = True
     _attr_temperature_unit = UnitOfTemperature.CELSIUS
-    _attr_hvac_modes = [HVACMode.OFF] + list(HVAC_MODES.values())
+    _attr_hvac_modes = [HVACMode.OFF] + [HVACMode(mode) for mode in HVAC_MODES.values()]
     _attr_fan_modes = list(FAN_MODES.values())
     _attr_swing_modes = list(SWING_MODES.values())
     _attr_min_temp = MIN_TEMP
@@ -107,7 +89,8 @@ class BemfaClimate(CoordinatorEntity, BemfaBaseEntity, ClimateEntity):
     def __init__(self, coordinator, mqtt_client, topic, entry):
         """初始化巴法云空调设备."""
         super().__init__(coordinator)
-        BemfaBaseEntity.__init__(self, topic, coordinator.data[topic]["name"])
+        device = coordinator.data[topic]
+        BemfaBaseEntity.__init__(self, topic, coordinator.get_device_info(topic))
         
         self._topic = topic
         self._mqtt_client = mqtt_client
@@ -115,38 +98,25 @@ class BemfaClimate(CoordinatorEntity, BemfaBaseEntity, ClimateEntity):
         self._attr_unique_id = f"{DOMAIN}_{topic}_climate"
         self._attr_name = "空调"
         
-        self._parse_state(coordinator.data[topic].get("state", ""))
+        self._parse_state(device.state)
 
     def _parse_state(self, state: str) -> None:
         """解析设备状态."""
-        if not state:
+        climate = decode("climate", state)
+        if not climate.is_on:
             self._attr_hvac_mode = HVACMode.OFF
-            self._attr_target_temperature = MIN_TEMP
-            self._attr_fan_mode = FAN_AUTO
-            self._attr_swing_mode = SWING_OFF
-            return
-
-        parts = state.split(MSG_SEPARATOR)
-        self._attr_hvac_mode = HVACMode.OFF if parts[0].lower() != MSG_ON else HVACMode.AUTO
-        
-        if len(parts) > 1 and self._attr_hvac_mode != HVACMode.OFF:
-            self._attr_hvac_mode = HVAC_MODES.get(parts[1], HVACMode.AUTO)
+        else:
+            self._attr_hvac_mode = HVACMode(HVAC_MODES.get(climate.mode, HVACMode.AUTO))
         
-        if len(parts) > 2 and self._attr_hvac_mode != HVACMode.OFF:
-            try:
-                self._attr_target_temperature = float(parts[2])
-            except (ValueError, IndexError):
-                self._attr_target_temperature = MIN_TEMP
+        # 消息中未包含的字段保持原值
+        if climate.temperature is not None:
+            self._attr_target_temperature = climate.temperature
         
-        if len(parts) > 3 and self._attr_hvac_mode != HVACMode.OFF:
-            self._attr_fan_mode = FAN_MODES.get(parts[3], FAN_AUTO)
+        if climate.fan is not None:
+            self._attr_fan_mode = FAN_MODES.get(climate.fan, FAN_AUTO)
         
-        if len(parts) > 5 and self._attr_hvac_mode != HVACMode.OFF:
-            try:
-                swing_key = f"{parts[4]}#{parts[5]}"
-                self._attr_swing_mode = SWING_MODES.get(swing_key, SWING_OFF)
-            except (ValueError, IndexError):
-                self._attr_swing_mode = SWING_OFF
+        if climate.swing is not None:
+            self._attr_swing_mode = SWING_MODES.get(climate.swing, SWING_OFF)
 
     async def async_set_temperature(self, **kwargs: Any) -> None:
         """设置温度."""
@@ -157,7 +127,7 @@ class BemfaClimate(CoordinatorEntity, BemfaBaseEntity, ClimateEntity):
     async def async_set_hvac_mode(self, hvac_mode: HVACMode) -> None:
         """设置空调模式."""
         if hvac_mode == HVACMode.OFF:
-            await self._async_send_command(MSG_OFF)
+            await self._async_send_command(encode_climate(False))
         else:
             await self._async_update_state(hvac_mode=hvac_mode)
 
@@ -187,34 +157,38 @@ class BemfaClimate(CoordinatorEntity, BemfaBaseEntity, ClimateEntity):
             swing_mode = self.swing_mode
 
         if hvac_mode == HVACMode.OFF:
-            await self._async_send_command(MSG_OFF)
+            await self._async_send_command(encode_climate(False))
             return
 
-        mode = HVAC_MODES_REVERSE.get(hvac_mode, "1")
-        temp = int(max(MIN_TEMP, min(MAX_TEMP, temperature)))
-        fan = FAN_MODES_REVERSE.get(fan_mode, "0")
-        swing = SWING_MODES_REVERSE.get(swing_mode, "0#0")
-        
-        msg = f"{MSG_ON}#{mode}#{temp}#{fan}#{swing}"
+        msg = encode_climate(
+            True,
+            HVAC_MODES_REVERSE.get(hvac_mode, "1"),
+            temperature,
+            FAN_MODES_REVERSE.get(fan_mode, "0"),
+            SWING_MODES_REVERSE.get(swing_mode, "0#0"),
+        )
         await self._async_send_command(msg)
 
     async def _async_send_command(self, command: str) -> None:
         """发送命令到巴法云."""
         try:
-            self._mqtt_client.publish(f"{self._topic}/set", command)
+            self._mqtt_client.async_send(
+                f"{self._topic}/set",
+                command,
+                self.coordinator.async_track_command(self._topic, command),
+            )
             self._parse_state(command)
             self.async_write_ha_state()
-            await self.coordinator.async_request_refresh()
         except Exception as ex:
             _LOGGER.error("发送命令失败: %s", ex)
 
     @property
     def available(self) -> bool:
         """返回设备是否可用."""
-        return self.coordinator.data.get(self._topic, {}).get("online", True)
+        device = self.coordinator.data.get(self._topic)
+        return device.online if device is not None else True
 
     def _handle_coordinator_update(self) -> None:
         """处理设备状态更新."""
-        device = self.coordinator.data.get(self._topic, {})
-        self._parse_state(device.get("state", ""))
-        self.hass.loop.call_soon_threadsafe(self.async_write_ha_state)
\ No newline at end of file
+        self._parse_state(self.coordinator.get_state(self._topic))
+        self.async_write_ha_state_if_changed()
@@ -0,0 +1,267 @@
+"""巴法云消息编解码."""
+from __future__ import annotations
+
+from collections.abc import Callable
+from functools import lru_cache
+from typing import Any, NamedTuple
+
+from .const import (
+    MSG_SEPARATOR,
+    MSG_ON,
+    MSG_OFF,
+    CODEC_CACHE_SIZE,
+)
+
+# 色温范围（开尔文）
+MIN_KELVIN = 2700  # 暖光
+MAX_KELVIN = 6500  # 冷光
+
+# 风扇档位数
+FAN_SPEED_COUNT = 4
+
+# 空调温度范围
+MIN_TEMP = 16
+MAX_TEMP = 32
+
+# 空调模式映射, 值与 Home Assistant 的 HVACMode 和风速/扫风常量相同,
+# 这里直接使用字符串, 编解码不需要加载空调集成
+HVAC_MODES = {
+    "1": "auto",
+    "2": "cool",
+    "3": "heat",
+    "4": "fan_only",
+    "5": "dry",
+}
+HVAC_MODES_REVERSE = {v: k for k, v in HVAC_MODES.items()}
+
+# 风速映射
+FAN_MODES = {
+    "0": "auto",
+    "1": "low",
+    "2": "medium",
+    "3": "high",
+}
+FAN_MODES_REVERSE = {v: k for k, v in FAN_MODES.items()}
+
+# 扫风映射
+SWING_MODES = {
+    "0#0": "off",
+    "1#0": "horizontal",
+    "0#1": "vertical",
+    "1#1": "both",
+}
+SWING_MODES_REVERSE = {v: k for k, v in SWING_MODES.items()}
+
+COVER_PAUSE = "pause"
+
+class SwitchState(NamedTuple):
+    """开关状态."""
+    is_on: bool
+
+class LightState(NamedTuple):
+    """灯光状态, kelvin 为 None 时表示未上报色温."""
+    is_on: bool
+    brightness: int
+    kelvin: int | None
+
+class FanState(NamedTuple):
+    """风扇状态, speed 为 0 时表示未知档位."""
+    is_on: bool
+    speed: int
+    oscillating: bool
+
+class SensorState(NamedTuple):
+    """传感器状态, fields 为消息中的字段数."""
+    fields: int
+    temperature: float | None = None
+    humidity: float | None = None
+    switch: bool | None = None
+    illuminance: float | None = None
+    pm25: float | None = None
+    heart_rate: float | None = None
+
+class ClimateState(NamedTuple):
+    """空调状态, 为 None 的字段表示消息中未包含."""
+    is_on: bool
+    mode: str | None = None
+    temperature: float | None = None
+    fan: str | None = None
+    swing: str | None = None
+
+class CoverState(NamedTuple):
+    """窗帘状态, command 为 on/off/pause."""
+    command: str
+    position: int | None = None
+
+def decode_switch(payload: str) -> SwitchState:
+    """解析开关消息."""
+    return SwitchState(payload.lower() == MSG_ON)
+
+def decode_light(payload: str) -> LightState:
+    """解析灯光消息: on#亮度#色温."""
+    if not payload:
+        return LightState(False, 0, None)
+
+    parts = payload.split(MSG_SEPARATOR)
+    is_on = parts[0].lower() == MSG_ON
+    if not is_on:
+        return LightState(False, 0, None)
+
+    brightness = 255
+    if len(parts) > 1:
+        try:
+            brightness = int(min(255, max(0, float(parts[1]) * 255 / 100)))
+        except ValueError:
+            pass
+
+    kelvin = None
+    if len(parts) > 2:
+        try:
+            kelvin = max(MIN_KELVIN, min(MAX_KELVIN, round(int(parts[2]) / 100) * 100))
+        except ValueError:
+            pass
+
+    return LightState(True, brightness, kelvin)
+
+def decode_fan(payload: str) -> FanState:
+    """解析风扇消息: on#档位#摇头."""
+    if not payload:
+        return FanState(False, 0, False)
+
+    parts = payload.split(MSG_SEPARATOR)
+    if parts[0].lower() != MSG_ON:
+        return FanState(False, 0, False)
+
+    speed = 0
+    if len(parts) > 1:
+        try:
+            speed = int(parts[1])
+        except ValueError:
+            pass
+        if not 1 <= speed <= FAN_SPEED_COUNT:
+            speed = 0
+
+    return FanState(True, speed, len(parts) > 2 and parts[2] == "1")
+
+def _decode_float(value: str) -> float | None:
+    """解析传感器数值."""
+    value = value.strip()
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+def decode_sensor(payload: str) -> SensorState:
+    """解析传感器消息: #温度#湿度#开关#光照#pm2.5#心率."""
+    if not payload:
+        return SensorState(0)
+
+    parts = payload.split(MSG_SEPARATOR)
+    count = len(parts)
+    switch = None
+    if count > 3:
+        value = parts[3].strip().lower()
+        switch = bool(value) and value == MSG_ON
+
+    return SensorState(
+        count,
+        _decode_float(parts[1]) if count > 1 else None,
+        _decode_float(parts[2]) if count > 2 else None,
+        switch,
+        _decode_float(parts[4]) if count > 4 else None,
+        _decode_float(parts[5]) if count > 5 else None,
+        _decode_float(parts[6]) if count > 6 else None,
+    )
+
+def decode_climate(payload: str) -> ClimateState:
+    """解析空调消息: on#模式#温度#风速#水平扫风#垂直扫风."""
+    if not payload:
+        return ClimateState(False, None, MIN_TEMP, "0", f"0{MSG_SEPARATOR}0")
+
+    parts = payload.split(MSG_SEPARATOR)
+    if parts[0].lower() != MSG_ON:
+        return ClimateState(False)
+
+    count = len(parts)
+    temperature = None
+    if count > 2:
+        try:
+            temperature = float(parts[2])
+        except ValueError:
+            temperature = MIN_TEMP
+
+    return ClimateState(
+        True,
+        parts[1] if count > 1 else None,
+        temperature,
+        parts[3] if count > 3 else None,
+        f"{parts[4]}{MSG_SEPARATOR}{parts[5]}" if count > 5 else None,
+    )
+
+def decode_cover(payload: str) -> CoverState:
+    """解析窗帘消息: on/off/pause#位置."""
+    if not payload:
+        return CoverState(MSG_OFF, 0)
+
+    parts = payload.split(MSG_SEPARATOR)
+    position = None
+    if len(parts) > 1:
+        try:
+            position = int(parts[1])
+        except ValueError:
+            pass
+
+    return CoverState(parts[0], position)
+
+DECODERS: dict[str, Callable[[str], Any]] = {
+    "switch": decode_switch,
+    "light": decode_light,
+    "fan": decode_fan,
+    "sensor": decode_sensor,
+    "climate": decode_climate,
+    "cover": decode_cover,
+}
+
+@lru_cache(maxsize=CODEC_CACHE_SIZE)
+def decode(device_type: str, payload: str) -> Any:
+    """按设备类型解析消息, 相同的消息只解析一次."""
+    return DECODERS[device_type](payload)
+
+def encode_switch(is_on: bool) -> str:
+    """生成开关命令."""
+    return MSG_ON if is_on else MSG_OFF
+
+def encode_light(is_on: bool, brightness: int = 255, kelvin: int = MIN_KELVIN) -> str:
+    """生成灯光命令, 亮度为 0-255."""
+    if not is_on:
+        return MSG_OFF
+    brightness_pct = max(1, min(100, round(brightness * 100 / 255)))
+    kelvin = max(MIN_KELVIN, min(MAX_KELVIN, round(kelvin / 100) * 100))
+    return f"{MSG_ON}{MSG_SEPARATOR}{brightness_pct}{MSG_SEPARATOR}{kelvin}"
+
+def encode_fan(is_on: bool, speed: int = 1, oscillating: bool = False) -> str:
+    """生成风扇命令."""
+    if not is_on:
+        return MSG_OFF
+    return f"{MSG_ON}{MSG_SEPARATOR}{speed}{MSG_SEPARATOR}{'1' if oscillating else '0'}"
+
+def encode_climate(
+    is_on: bool,
+    mode: str = "1",
+    temperature: float = MIN_TEMP,
+    fan: str = "0",
+    swing: str = "0#0",
+) -> str:
+    """生成空调命令."""
+    if not is_on:
+        return MSG_OFF
+    temp = int(max(MIN_TEMP, min(MAX_TEMP, temperature)))
+    return MSG_SEPARATOR.join((MSG_ON, mode, str(temp), fan, swing))
+
+def encode_cover(command: str, position: int | None = None) -> str:
+    """生成窗帘命令, 指定位置时 command 为 on."""
+    if position is not None:
+        return f"{MSG_ON}{MSG_SEPARATOR}{position}"
+    return command
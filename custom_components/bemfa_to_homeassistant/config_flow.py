@@ -4,15 +4,40 @@ from __future__ import annotations
 import logging
 from typing import Any
 
-import requests
 import voluptuous as vol
 
 from homeassistant import config_entries
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.data_entry_flow import FlowResult
 from homeassistant.exceptions import HomeAssistantError
 
-from .const import DOMAIN, CONF_API_KEY, BEMFA_API_URL
+from .const import (
+    DOMAIN,
+    CONF_API_KEY,
+    CONF_INBOX_WINDOW,
+    DEFAULT_INBOX_WINDOW,
+    CONF_TRANSPORT,
+    DEFAULT_TRANSPORT,
+    TRANSPORT_THREAD,
+    TRANSPORT_ASYNCIO,
+    CONF_COMMAND_TIMEOUT,
+    DEFAULT_COMMAND_TIMEOUT,
+    CONF_PERF_SENSORS,
+    DEFAULT_PERF_SENSORS,
+    CONF_COMMAND_QOS,
+    DEFAULT_COMMAND_QOS,
+    CONF_MQTT_SHARDS,
+    DEFAULT_MQTT_SHARDS,
+    MAX_MQTT_SHARDS,
+    CONF_SENSOR_DEADBANDS,
+    DEFAULT_SENSOR_DEADBANDS,
+    CONF_SENSOR_MIN_INTERVAL,
+    DEFAULT_SENSOR_MIN_INTERVAL,
+    CONF_SENSOR_MAX_AGE,
+    DEFAULT_SENSOR_MAX_AGE,
+)
+from .api import BemfaApiClient, BemfaApiError, BemfaRateLimited
+from .deadband import parse_deadbands
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -23,18 +48,12 @@ STEP_USER_DATA_SCHEMA = vol.Schema({
 async def validate_api_key(hass: HomeAssistant, api_key: str) -> bool:
     """验证API密钥."""
     try:
-        def _validate():
-            response = requests.get(
-                BEMFA_API_URL,
-                params={"uid": api_key, "type": "1"},
-                timeout=10
-            )
-            response.raise_for_status()
-            return response.json().get("code") == 0
-
-        return await hass.async_add_executor_job(_validate)
-    except requests.RequestException:
+        response = await BemfaApiClient(hass, api_key).async_get_all_topics()
+    except BemfaRateLimited as err:
+        raise CannotConnect from err
+    except BemfaApiError:
         return False
+    return response.get("code") == 0
 
 class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
     """处理配置流程."""
@@ -55,6 +74,8 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
                         data=user_input,
                     )
                 errors["base"] = "invalid_auth"
+            except CannotConnect:
+                errors["base"] = "cannot_connect"
             except Exception:
                 errors["base"] = "unknown"
 
@@ -64,6 +85,81 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             errors=errors,
         )
 
+    @staticmethod
+    @callback
+    def async_get_options_flow(
+        config_entry: config_entries.ConfigEntry,
+    ) -> OptionsFlowHandler:
+        """获取选项流程."""
+        return OptionsFlowHandler(config_entry)
+
+class OptionsFlowHandler(config_entries.OptionsFlow):
+    """处理选项流程."""
+
+    def __init__(self, config_entry: config_entries.ConfigEntry) -> None:
+        """初始化选项流程."""
+        self._entry = config_entry
+
+    async def async_step_init(
+        self, user_input: dict[str, Any] | None = None
+    ) -> FlowResult:
+        """处理选项输入."""
+        errors = {}
+
+        if user_input is not None:
+            try:
+                parse_deadbands(user_input.get(CONF_SENSOR_DEADBANDS, ""))
+            except vol.Invalid:
+                errors[CONF_SENSOR_DEADBANDS] = "invalid_deadbands"
+            else:
+                return self.async_create_entry(title="", data=user_input)
+
+        options = {**self._entry.options, **(user_input or {})}
+        return self.async_show_form(
+            step_id="init",
+            data_schema=vol.Schema({
+                vol.Optional(
+                    CONF_INBOX_WINDOW,
+                    default=options.get(CONF_INBOX_WINDOW, DEFAULT_INBOX_WINDOW),
+                ): vol.All(vol.Coerce(int), vol.Range(min=0, max=1000)),
+                vol.Optional(
+                    CONF_TRANSPORT,
+                    default=options.get(CONF_TRANSPORT, DEFAULT_TRANSPORT),
+                ): vol.In([TRANSPORT_THREAD, TRANSPORT_ASYNCIO]),
+                vol.Optional(
+                    CONF_MQTT_SHARDS,
+                    default=options.get(CONF_MQTT_SHARDS, DEFAULT_MQTT_SHARDS),
+                ): vol.All(vol.Coerce(int), vol.Range(min=1, max=MAX_MQTT_SHARDS)),
+                vol.Optional(
+                    CONF_COMMAND_TIMEOUT,
+                    default=options.get(CONF_COMMAND_TIMEOUT, DEFAULT_COMMAND_TIMEOUT),
+                ): vol.All(vol.Coerce(int), vol.Range(min=1, max=60)),
+                vol.Optional(
+                    CONF_COMMAND_QOS,
+                    default=options.get(CONF_COMMAND_QOS, DEFAULT_COMMAND_QOS),
+                ): vol.All(vol.Coerce(int), vol.In([0, 1])),
+                vol.Optional(
+                    CONF_SENSOR_MIN_INTERVAL,
+                    default=options.get(
+                        CONF_SENSOR_MIN_INTERVAL, DEFAULT_SENSOR_MIN_INTERVAL
+                    ),
+                ): vol.All(vol.Coerce(int), vol.Range(min=0, max=3600)),
+                vol.Optional(
+                    CONF_SENSOR_MAX_AGE,
+                    default=options.get(CONF_SENSOR_MAX_AGE, DEFAULT_SENSOR_MAX_AGE),
+                ): vol.All(vol.Coerce(int), vol.Range(min=0, max=86400)),
+                vol.Optional(
+                    CONF_SENSOR_DEADBANDS,
+                    default=options.get(CONF_SENSOR_DEADBANDS, DEFAULT_SENSOR_DEADBANDS),
+                ): str,
+                vol.Optional(
+                    CONF_PERF_SENSORS,
+                    default=options.get(CONF_PERF_SENSORS, DEFAULT_PERF_SENSORS),
+                ): bool,
+            }),
+            errors=errors,
+        )
+
 class CannotConnect(HomeAssistantError):
     """表示无法连接的错误."""
 
@@ -0,0 +1,294 @@
+"""巴法云MQTT连接管理."""
+from __future__ import annotations
+
+import asyncio
+import logging
+import zlib
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+import paho.mqtt.client as mqtt
+
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+
+from .const import (
+    DATA_CONNECTIONS,
+    DEFAULT_COMMAND_QOS,
+    DEFAULT_MQTT_SHARDS,
+    TOPIC_PING,
+    TRANSPORT_THREAD,
+)
+from .heartbeat import BemfaHeartbeat
+from .metrics import BemfaMetrics
+from .outbox import BemfaOutbox
+from .transport import BemfaMqttTransport
+from .watchdog import BemfaWatchdog
+
+_LOGGER = logging.getLogger(__name__)
+
+def shard_client_id(uid: str, shard: int) -> str:
+    """返回分片的客户端ID, 第一个分片沿用 uid 本身."""
+    return uid if shard == 0 else f"{uid}_{shard}"
+
+class BemfaConnectionManager:
+    """管理同一个 uid 的MQTT连接.
+
+    同一个 uid 只建立一组连接, 由多个配置条目共享, 避免相同的客户端ID互相踢下线.
+    主题按 CRC32 哈希固定分配到 N 个分片上, 每个分片使用不同的客户端ID,
+    拥有独立的套接字和 paho 线程. 对外提供与 BemfaMqttTransport 相同的接口.
+    控制命令经过共享的发件箱合并和限速后再发布. 心跳, 看门狗和链路指标属于连接本身,
+    每组连接只有一份, 不随共享它的配置条目数量增加.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        uid: str,
+        mode: str = TRANSPORT_THREAD,
+        shards: int = DEFAULT_MQTT_SHARDS,
+        command_qos: int = DEFAULT_COMMAND_QOS,
+    ) -> None:
+        """初始化连接管理器."""
+        self._hass = hass
+        self._uid = uid
+        self._handlers: tuple[Callable[[str, str], None], ...] = ()
+        self._resync_handlers: tuple[Callable[[], Awaitable[Any]], ...] = ()
+        self._connect_lock = asyncio.Lock()
+        self._started = False
+        self.refs = 0
+        self.command_qos = command_qos
+        self.metrics = BemfaMetrics()
+        self.transports = [
+            BemfaMqttTransport(
+                hass, shard_client_id(uid, shard), self._on_message, mode, self.metrics
+            )
+            for shard in range(max(1, shards))
+        ]
+        self.outbox = BemfaOutbox(
+            hass,
+            self.publish,
+            qos=command_qos,
+            metrics=self.metrics,
+            discard_ack=self.discard_ack,
+        )
+        self.heartbeat = BemfaHeartbeat(hass, self.publish)
+        self.watchdog = BemfaWatchdog(hass, self.heartbeat, self, self._async_resync)
+        # 心跳主题的订阅发出后才开始心跳, 第一个心跳不会因为还没订阅而丢失
+        self._unsub_monitor = (
+            self.watchdog.async_start(),
+            self.async_add_connect_listener(self.heartbeat.async_start),
+        )
+        self.async_subscribe({TOPIC_PING})
+
+    @property
+    def mode(self) -> str:
+        """返回连接模式."""
+        return self.transports[0].mode
+
+    @property
+    def connected(self) -> bool:
+        """返回所有分片是否都已连接."""
+        return all(transport.connected for transport in self.transports)
+
+    @property
+    def fully_subscribed(self) -> bool:
+        """返回所有分片是否都已收到全部订阅确认."""
+        return all(transport.fully_subscribed for transport in self.transports)
+
+    @property
+    def last_subscribe_duration(self) -> float | None:
+        """返回最慢分片的订阅耗时."""
+        durations = [
+            transport.last_subscribe_duration
+            for transport in self.transports
+            if transport.last_subscribe_duration is not None
+        ]
+        return max(durations) if durations else None
+
+    def _shard_index(self, topic: str) -> int:
+        """返回主题所在分片的序号, 同一个主题总是分配到同一个分片."""
+        if len(self.transports) == 1:
+            return 0
+        return zlib.crc32(topic.encode()) % len(self.transports)
+
+    def shard_for(self, topic: str) -> BemfaMqttTransport:
+        """返回主题所在的分片."""
+        return self.transports[self._shard_index(topic)]
+
+    @callback
+    def async_add_message_handler(
+        self, handler: Callable[[str, str], None]
+    ) -> CALLBACK_TYPE:
+        """注册消息处理函数, 处理函数会在MQTT线程中被调用."""
+        self._handlers = (*self._handlers, handler)
+
+        @callback
+        def remove_handler() -> None:
+            """移除消息处理函数."""
+            self._handlers = tuple(item for item in self._handlers if item is not handler)
+
+        return remove_handler
+
+    @callback
+    def async_add_resync_handler(
+        self, handler: Callable[[], Awaitable[Any]]
+    ) -> CALLBACK_TYPE:
+        """注册链路恢复后的全量同步函数."""
+        self._resync_handlers = (*self._resync_handlers, handler)
+
+        @callback
+        def remove_handler() -> None:
+            """移除全量同步函数."""
+            self._resync_handlers = tuple(
+                item for item in self._resync_handlers if item is not handler
+            )
+
+        return remove_handler
+
+    async def _async_resync(self) -> None:
+        """链路恢复后让所有配置条目同步一次."""
+        await asyncio.gather(*(handler() for handler in self._resync_handlers))
+
+    def _on_message(self, topic: str, payload: str) -> None:
+        """处理心跳回传, 其他消息分发给所有配置条目."""
+        if topic == TOPIC_PING:
+            self.metrics.count_message("heartbeat")
+            self._hass.loop.call_soon_threadsafe(self.heartbeat.async_pong_received)
+            return
+        for handler in self._handlers:
+            handler(topic, payload)
+
+    async def async_connect(self) -> None:
+        """连接所有分片, 已经连接时直接返回."""
+        async with self._connect_lock:
+            if self._started:
+                return
+            results = await asyncio.gather(
+                *(transport.async_connect() for transport in self.transports),
+                return_exceptions=True,
+            )
+            errors = [result for result in results if isinstance(result, BaseException)]
+            if errors:
+                await self.async_disconnect()
+                raise errors[0]
+            self._started = True
+
+    @callback
+    def async_stop(self) -> None:
+        """停止心跳, 看门狗和发件箱."""
+        for unsub in self._unsub_monitor:
+            unsub()
+        self.heartbeat.async_stop()
+        self.outbox.async_stop()
+
+    async def async_disconnect(self) -> None:
+        """断开所有分片."""
+        await asyncio.gather(
+            *(transport.async_disconnect() for transport in self.transports)
+        )
+
+    async def async_reconnect(self) -> None:
+        """强制所有分片重新连接."""
+        await asyncio.gather(
+            *(transport.async_reconnect() for transport in self.transports)
+        )
+
+    def publish(
+        self,
+        topic: str,
+        payload: str,
+        qos: int = 0,
+        on_ack: CALLBACK_TYPE | None = None,
+    ) -> mqtt.MQTTMessageInfo:
+        """通过主题所在的分片发布消息."""
+        return self.shard_for(topic.removesuffix("/set")).publish(
+            topic, payload, qos, on_ack
+        )
+
+    @callback
+    def discard_ack(self, topic: str, mid: int) -> None:
+        """释放主题所在分片上报文ID的确认回调."""
+        self.shard_for(topic.removesuffix("/set")).discard_ack(mid)
+
+    @callback
+    def async_send(
+        self,
+        topic: str,
+        payload: str,
+        on_publish: Callable[[], None] | None = None,
+    ) -> None:
+        """通过发件箱发送控制命令, on_publish 在命令发布后调用."""
+        self.outbox.async_send(topic, payload, on_publish)
+
+    @callback
+    def async_subscribe(self, topics: set[str]) -> None:
+        """按分片订阅主题."""
+        groups: dict[int, set[str]] = {}
+        for topic in topics:
+            groups.setdefault(self._shard_index(topic), set()).add(topic)
+        for index, group in groups.items():
+            self.transports[index].async_subscribe(group)
+
+    @callback
+    def async_unsubscribe(self, topics: set[str]) -> None:
+        """按分片取消订阅主题."""
+        groups: dict[int, set[str]] = {}
+        for topic in topics:
+            groups.setdefault(self._shard_index(topic), set()).add(topic)
+        for index, group in groups.items():
+            self.transports[index].async_unsubscribe(group)
+
+    @callback
+    def async_add_connect_listener(self, update_callback: CALLBACK_TYPE) -> CALLBACK_TYPE:
+        """注册心跳主题所在分片的连接监听器."""
+        return self.shard_for(TOPIC_PING).async_add_connect_listener(update_callback)
+
+@callback
+def async_get_connection(
+    hass: HomeAssistant,
+    uid: str,
+    mode: str = TRANSPORT_THREAD,
+    shards: int = DEFAULT_MQTT_SHARDS,
+    command_qos: int = DEFAULT_COMMAND_QOS,
+) -> BemfaConnectionManager:
+    """获取 uid 的共享连接, 不存在时创建.
+
+    同一个 uid 的客户端ID相同, 不能按选项分别建立连接, 共享时沿用第一个配置条目的
+    连接选项, 选项不一致时记录警告.
+    """
+    connections: dict[str, BemfaConnectionManager] = hass.data.setdefault(
+        DATA_CONNECTIONS, {}
+    )
+    if (manager := connections.get(uid)) is None:
+        manager = BemfaConnectionManager(hass, uid, mode, shards, command_qos)
+        connections[uid] = manager
+    elif (mode, max(1, shards), command_qos) != (
+        manager.mode,
+        len(manager.transports),
+        manager.command_qos,
+    ):
+        _LOGGER.warning(
+            "uid 已有MQTT连接, 本条目的连接选项(模式 %s, 分片 %d, 命令QoS %d)不会生效, "
+            "共享连接使用模式 %s, 分片 %d, 命令QoS %d",
+            mode,
+            shards,
+            command_qos,
+            manager.mode,
+            len(manager.transports),
+            manager.command_qos,
+        )
+    else:
+        _LOGGER.debug("uid 已有MQTT连接, 多个配置条目共享同一组连接")
+    manager.refs += 1
+    return manager
+
+async def async_release_connection(hass: HomeAssistant, uid: str) -> None:
+    """释放共享连接, 最后一个使用者释放时断开."""
+    connections: dict[str, BemfaConnectionManager] = hass.data[DATA_CONNECTIONS]
+    manager = connections[uid]
+    manager.refs -= 1
+    if manager.refs > 0:
+        return
+    del connections[uid]
+    manager.async_stop()
+    await manager.async_disconnect()
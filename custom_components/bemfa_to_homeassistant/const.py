@@ -10,6 +10,21 @@ CONF_API_KEY: Final = "api_key"
 MQTT_HOST: Final = "bemfa.com"
 MQTT_PORT: Final = 9501
 MQTT_KEEPALIVE: Final = 600
+MQTT_RECONNECT_DELAY: Final = 10
+# 每个 SUBSCRIBE 报文最多包含的主题数
+MQTT_SUBSCRIBE_BATCH: Final = 64
+
+# MQTT 传输模式: thread 使用 paho 后台线程, asyncio 由事件循环驱动套接字
+CONF_TRANSPORT: Final = "transport"
+TRANSPORT_THREAD: Final = "thread"
+TRANSPORT_ASYNCIO: Final = "asyncio"
+DEFAULT_TRANSPORT: Final = TRANSPORT_THREAD
+
+# MQTT 连接分片: 同一个 uid 的连接由所有配置条目共享, 主题按哈希分布到多个连接
+DATA_CONNECTIONS: Final = f"{DOMAIN}_connections"
+CONF_MQTT_SHARDS: Final = "mqtt_shards"
+DEFAULT_MQTT_SHARDS: Final = 1
+MAX_MQTT_SHARDS: Final = 8
 
 TOPIC_PREFIX: Final = "hass"
 TOPIC_PING: Final = f"{TOPIC_PREFIX}ping"
@@ -19,16 +34,85 @@ INTERVAL_PING_SEND: Final = 30
 INTERVAL_PING_RECEIVE: Final = 20  
 MAX_PING_LOST: Final = 3
 
+# 心跳丢失后强制重连的指数退避(秒)
+RECONNECT_BASE_DELAY: Final = 2
+RECONNECT_MAX_DELAY: Final = 300
+
+# MQTT 收件箱: 合并窗口(毫秒)与最多缓存的主题数
+CONF_INBOX_WINDOW: Final = "inbox_window"
+DEFAULT_INBOX_WINDOW: Final = 100
+INBOX_MAX_SIZE: Final = 4096
+
 # 消息格式
 MSG_SEPARATOR: Final = "#"
 MSG_ON: Final = "on"
 MSG_OFF: Final = "off"
 
+# 解析结果缓存的消息条数
+CODEC_CACHE_SIZE: Final = 4096
+
 # API URLs
 BEMFA_API_URL: Final = "https://apis.bemfa.com/va/alltopic"
+BEMFA_MSG_API_URL: Final = "https://apis.bemfa.com/va/getmsg"
+
+# API 请求: 超时(秒), 令牌桶速率(次/秒)与突发容量, 限流后默认等待时间(秒)
+DATA_RATE_LIMITER: Final = f"{DOMAIN}_rate_limiter"
+API_TIMEOUT: Final = 10
+API_RATE: Final = 1
+API_BURST: Final = 5
+API_RETRY_AFTER: Final = 60
 
 # 更新间隔
 DEFAULT_SCAN_INTERVAL: Final = 30
+# MQTT 心跳正常时的兜底轮询间隔(秒), 设为 None 时只依赖推送
+PUSH_HEALTHY_SCAN_INTERVAL: Final = 900
+
+# 主题连续多少次成功轮询都不在设备列表中才移除其设备和实体
+TOPIC_REMOVE_AFTER: Final = 2
+
+# 命令确认: 等待设备通过MQTT回显状态的超时时间(秒), 超时后只查询该主题
+CONF_COMMAND_TIMEOUT: Final = "command_timeout"
+DEFAULT_COMMAND_TIMEOUT: Final = 5
+
+# 命令发件箱: 合并窗口(秒), 全局令牌桶速率(条/秒)与突发容量, 同一主题的最小发送间隔(秒)
+COMMAND_WINDOW: Final = 0.05
+COMMAND_RATE: Final = 10
+COMMAND_BURST: Final = 20
+COMMAND_TOPIC_INTERVAL: Final = 0.5
+# 命令发布: 控制命令的QoS, 等待服务器确认的超时时间(秒)与最多重发次数, 心跳始终使用 QoS 0
+CONF_COMMAND_QOS: Final = "command_qos"
+DEFAULT_COMMAND_QOS: Final = 1
+COMMAND_ACK_TIMEOUT: Final = 3
+COMMAND_MAX_RETRIES: Final = 2
+
+# 传感器数值过滤: 各类传感器默认的绝对死区和相对死区(比例), 同一实体两次写入的最小间隔(秒),
+# 死区内的变化最长多久写入一次(秒); 选项中可以按传感器类型或实体ID覆盖死区
+SENSOR_DEADBANDS: Final = {
+    "temperature": (0.2, 0.0),
+    "humidity": (1.0, 0.0),
+    "illuminance": (0.0, 0.05),
+    "pm25": (1.0, 0.05),
+    "heart_rate": (1.0, 0.0),
+}
+CONF_SENSOR_DEADBANDS: Final = "sensor_deadbands"
+DEFAULT_SENSOR_DEADBANDS: Final = ""
+CONF_SENSOR_MIN_INTERVAL: Final = "sensor_min_interval"
+DEFAULT_SENSOR_MIN_INTERVAL: Final = 10
+CONF_SENSOR_MAX_AGE: Final = "sensor_max_age"
+DEFAULT_SENSOR_MAX_AGE: Final = 300
+
+# 设备列表缓存: 存储版本, 变化后延迟写入的时间(秒)
+CACHE_STORAGE_VERSION: Final = 1
+CACHE_SAVE_DELAY: Final = 60
+
+# 诊断指标: 耗时直方图的分桶上界(毫秒)
+HISTOGRAM_BUCKETS: Final = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+# 性能诊断传感器: 是否启用, 刷新间隔(秒)与速率统计窗口(秒)
+CONF_PERF_SENSORS: Final = "perf_sensors"
+DEFAULT_PERF_SENSORS: Final = False
+PERF_SENSOR_INTERVAL: Final = 60
+PERF_SENSOR_WINDOW: Final = 300
 
 # 设备信息
 MANUFACTURER = "巴法云"
@@ -10,23 +10,21 @@ from homeassistant.components.cover import (
     ATTR_POSITION,
 )
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 from homeassistant.helpers.update_coordinator import CoordinatorEntity
 
+from .codec import COVER_PAUSE, decode, encode_cover
 from .const import (
     DOMAIN,
     CONF_API_KEY,
     MSG_ON,
     MSG_OFF,
-    MSG_SEPARATOR,
 )
 from .helpers import BemfaBaseEntity
 
 _LOGGER = logging.getLogger(__name__)
 
-COVER_PAUSE = "pause"
-
 async def async_setup_entry(
     hass: HomeAssistant,
     entry: ConfigEntry,
@@ -36,18 +34,24 @@ async def async_setup_entry(
     coordinator = hass.data[DOMAIN][entry.entry_id]["coordinator"]
     mqtt_client = hass.data[DOMAIN][entry.entry_id]["mqtt_client"]
     
-    entities = [
-        BemfaCover(coordinator, mqtt_client, topic, entry)
-        for topic, device in coordinator.data.items()
-        if device["type"] == "cover"
-    ]
-    
-    if entities:
-        async_add_entities(entities)
+    @callback
+    def async_add_devices(added: set[str], removed: set[str]) -> None:
+        """为新增的主题创建窗帘实体, 移除的主题由设备注册表清理."""
+        entities = [
+            BemfaCover(coordinator, mqtt_client, topic, entry)
+            for topic in added
+            if coordinator.data[topic].type == "cover"
+        ]
+        if entities:
+            async_add_entities(entities)
+
+    async_add_devices(coordinator.data.keys(), set())
+    entry.async_on_unload(coordinator.async_add_device_listener(async_add_devices))
 
 class BemfaCover(CoordinatorEntity, BemfaBaseEntity, CoverEntity):
     """巴法云窗帘设备."""
 
+    _state_attrs = ("_attr_is_closed", "_attr_current_cover_position")
     _attr_has_entity_name = True
     _attr_supported_features = (
         CoverEntityFeature.OPEN |
@@ -59,7 +63,8 @@ class BemfaCover(CoordinatorEntity, BemfaBaseEntity, CoverEntity):
     def __init__(self, coordinator, mqtt_client, topic, entry):
         """初始化巴法云窗帘设备."""
         super().__init__(coordinator)
-        BemfaBaseEntity.__init__(self, topic, coordinator.data[topic]["name"])
+        device = coordinator.data[topic]
+        BemfaBaseEntity.__init__(self, topic, coordinator.get_device_info(topic))
         
         self._topic = topic
         self._mqtt_client = mqtt_client
@@ -67,70 +72,63 @@ class BemfaCover(CoordinatorEntity, BemfaBaseEntity, CoverEntity):
         self._attr_unique_id = f"{DOMAIN}_{topic}_cover"
         self._attr_name = "窗帘"
         
-        self._parse_state(coordinator.data[topic].get("state", ""))
+        self._parse_state(device.state)
 
     def _parse_state(self, state: str) -> None:
         """解析设备状态."""
-        if not state:
-            self._attr_is_closed = True
-            self._attr_current_cover_position = 0
-            return
-
-        parts = state.split(MSG_SEPARATOR)
+        cover = decode("cover", state)
         
-        if parts[0] == MSG_OFF:
+        if cover.command == MSG_OFF:
             self._attr_is_closed = True
             self._attr_current_cover_position = 0
-        elif parts[0] == MSG_ON:
+        elif cover.command == MSG_ON:
             self._attr_is_closed = False
             self._attr_current_cover_position = 100
-        elif parts[0] == COVER_PAUSE:
+        elif cover.command == COVER_PAUSE:
             pass
         
-        if len(parts) > 1:
-            try:
-                position = int(parts[1])
-                self._attr_current_cover_position = position
-                self._attr_is_closed = position == 0
-            except (ValueError, IndexError):
-                pass
+        if cover.position is not None:
+            self._attr_current_cover_position = cover.position
+            self._attr_is_closed = cover.position == 0
 
     async def async_open_cover(self, **kwargs: Any) -> None:
         """打开窗帘."""
-        await self._async_send_command(MSG_ON)
+        await self._async_send_command(encode_cover(MSG_ON))
 
     async def async_close_cover(self, **kwargs: Any) -> None:
         """关闭窗帘."""
-        await self._async_send_command(MSG_OFF)
+        await self._async_send_command(encode_cover(MSG_OFF))
 
     async def async_stop_cover(self, **kwargs: Any) -> None:
         """停止窗帘."""
-        await self._async_send_command(COVER_PAUSE)
+        await self._async_send_command(encode_cover(COVER_PAUSE))
 
     async def async_set_cover_position(self, **kwargs: Any) -> None:
         """设置窗帘位置."""
         position = kwargs.get(ATTR_POSITION)
         if position is not None:
-            msg = f"{MSG_ON}#{position}"
-            await self._async_send_command(msg)
+            await self._async_send_command(encode_cover(MSG_ON, position))
 
     async def _async_send_command(self, command: str) -> None:
         """发送命令到巴法云."""
         try:
-            self._mqtt_client.publish(f"{self._topic}/set", command)
+            self._mqtt_client.async_send(
+                f"{self._topic}/set",
+                command,
+                self.coordinator.async_track_command(self._topic, command),
+            )
             self._parse_state(command)
             self.async_write_ha_state()
-            await self.coordinator.async_request_refresh()
         except Exception as ex:
             _LOGGER.error("发送命令失败: %s", ex)
 
     @property
     def available(self) -> bool:
         """返回设备是否可用."""
-        return self.coordinator.data.get(self._topic, {}).get("online", True)
+        device = self.coordinator.data.get(self._topic)
+        return device.online if device is not None else True
 
     def _handle_coordinator_update(self) -> None:
         """处理设备状态更新."""
-        device = self.coordinator.data.get(self._topic, {})
-        self._parse_state(device.get("state", ""))
-        self.hass.loop.call_soon_threadsafe(self.async_write_ha_state)
\ No newline at end of file
+        self._parse_state(self.coordinator.get_state(self._topic))
+        self.async_write_ha_state_if_changed()
@@ -0,0 +1,138 @@
+"""巴法云传感器数值过滤."""
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Callable
+from math import inf, isfinite
+from time import monotonic
+
+import voluptuous as vol
+
+from homeassistant.core import HomeAssistant, callback
+
+from .metrics import BemfaMetrics
+
+_UNSET = object()
+
+def parse_deadbands(value: str) -> dict[str, tuple[float, float]]:
+    """解析死区设置: 逗号分隔的 键=死区, 键为传感器类型或实体ID, 死区以 % 结尾时为相对值."""
+    deadbands: dict[str, tuple[float, float]] = {}
+    for item in value.replace("\n", ",").split(","):
+        if not (item := item.strip()):
+            continue
+        key, separator, band = item.partition("=")
+        key, band = key.strip(), band.strip()
+        try:
+            if not key or not separator:
+                raise ValueError
+            if band.endswith("%"):
+                deadbands[key] = (0.0, float(band[:-1]) / 100)
+            else:
+                deadbands[key] = (float(band), 0.0)
+        except ValueError as err:
+            raise vol.Invalid(f"无效的死区设置: {item}") from err
+        if not all(isfinite(band) for band in deadbands[key]):
+            raise vol.Invalid(f"死区必须是有限的数值: {item}")
+        if min(deadbands[key]) < 0:
+            raise vol.Invalid(f"死区不能为负数: {item}")
+    return deadbands
+
+class BemfaDeadband:
+    """单个传感器实体的数值过滤器.
+
+    新数值与上次写入的数值之差达到死区(绝对值和相对上次数值的比例中较大的一个)
+    才算显著变化. 显著变化在距上次写入超过最小间隔后写入, 间隔内到达的只保留最新
+    一个并在间隔结束时写入; 死区内的变化不立即写入, 距上次写入超过最长间隔时写入
+    最新的数值, 保证实体状态落后于设备的时间不超过 max_age.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        write: Callable[[float | None], None],
+        absolute: float = 0.0,
+        relative: float = 0.0,
+        min_interval: float = 0.0,
+        max_age: float = 0.0,
+        metrics: BemfaMetrics | None = None,
+    ) -> None:
+        """初始化过滤器, max_age 为 0 时死区内的变化不再写入."""
+        self._hass = hass
+        self._write = write
+        self._absolute = absolute
+        self._relative = relative
+        self._min_interval = min_interval
+        self._max_age = max_age
+        self._metrics = metrics or BemfaMetrics()
+        self._last_value: float | None = None
+        self._last_write = -inf
+        self._pending: object = _UNSET
+        self._timer: asyncio.TimerHandle | None = None
+        self._timer_at = inf
+
+    @callback
+    def async_reset(self, value: float | None) -> None:
+        """以实体当前写入的数值作为比较基准, 丢弃等待中的旧数值."""
+        self._pending = _UNSET
+        self._last_value = value
+        self._last_write = monotonic()
+
+    def _is_significant(self, value: float | None) -> bool:
+        """判断相对上次写入的数值是否为显著变化."""
+        last = self._last_value
+        if value is None or last is None:
+            return value != last
+        delta = abs(value - last)
+        return delta > 0 and delta >= max(self._absolute, self._relative * abs(last))
+
+    @callback
+    def async_update(self, value: float | None) -> None:
+        """收到新数值, 按死区和间隔决定立即写入, 推迟写入或暂不写入."""
+        self._pending = value
+        if self._is_significant(value):
+            when = self._last_write + self._min_interval
+        elif value == self._last_value:
+            # 回到已写入的数值, 不再需要写入
+            self._pending = _UNSET
+            self._metrics.filtered_values += 1
+            return
+        elif self._max_age:
+            when = self._last_write + self._max_age
+        else:
+            self._metrics.filtered_values += 1
+            return
+
+        if when <= monotonic():
+            self._async_flush()
+            return
+        self._metrics.filtered_values += 1
+        if when < self._timer_at:
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer_at = when
+            self._timer = self._hass.loop.call_later(
+                when - monotonic(), self._async_flush
+            )
+
+    @callback
+    def _async_flush(self) -> None:
+        """写入等待中的最新数值."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._timer_at = inf
+        if (value := self._pending) is _UNSET:
+            return
+        self._pending = _UNSET
+        self._last_value = value
+        self._last_write = monotonic()
+        self._write(value)
+
+    @callback
+    def async_stop(self) -> None:
+        """停止过滤器并丢弃等待中的数值."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._timer_at = inf
+        self._pending = _UNSET
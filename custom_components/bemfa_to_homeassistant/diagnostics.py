@@ -0,0 +1,80 @@
+"""巴法云集成的诊断信息."""
+from __future__ import annotations
+
+from collections import Counter
+from typing import Any
+
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+
+from .const import DOMAIN, CONF_API_KEY
+
+TO_REDACT = {CONF_API_KEY}
+
+async def async_get_config_entry_diagnostics(
+    hass: HomeAssistant, entry: ConfigEntry
+) -> dict[str, Any]:
+    """返回配置条目的诊断信息."""
+    data = hass.data[DOMAIN][entry.entry_id]
+    coordinator = data["coordinator"]
+    mqtt_client = data["mqtt_client"]
+    inbox = data["inbox"]
+    heartbeat = data["heartbeat"]
+    watchdog = data["watchdog"]
+
+    return {
+        "entry": {
+            "data": async_redact_data(dict(entry.data), TO_REDACT),
+            "options": dict(entry.options),
+        },
+        "devices": dict(Counter(device.type for device in coordinator.store.values())),
+        "coordinator": {
+            "last_update_success": coordinator.last_update_success,
+            "update_interval": str(coordinator.update_interval),
+            "last_poll_changed": coordinator.last_poll_changed,
+            "last_poll_unchanged": coordinator.last_poll_unchanged,
+        },
+        "mqtt": {
+            "mode": mqtt_client.mode,
+            "connected": mqtt_client.connected,
+            "fully_subscribed": mqtt_client.fully_subscribed,
+            "last_subscribe_duration": mqtt_client.last_subscribe_duration,
+            "shards": [
+                {
+                    "connected": transport.connected,
+                    "fully_subscribed": transport.fully_subscribed,
+                    "last_subscribe_duration": transport.last_subscribe_duration,
+                }
+                for transport in mqtt_client.transports
+            ],
+            "shared_by_entries": mqtt_client.refs,
+            "metrics": mqtt_client.metrics.as_dict(),
+        },
+        "inbox": {
+            "queue_depth": inbox.queue_depth,
+            "received": inbox.received,
+            "coalesced": inbox.coalesced,
+            "dropped": inbox.dropped,
+            "flushes": inbox.flushes,
+        },
+        "outbox": {
+            "queue_depth": mqtt_client.outbox.queue_depth,
+            "inflight": mqtt_client.outbox.inflight,
+            "queued": mqtt_client.outbox.queued,
+            "coalesced": mqtt_client.outbox.coalesced,
+            "sent": mqtt_client.outbox.sent,
+            "rate_limited": mqtt_client.outbox.rate_limited,
+        },
+        "heartbeat": {
+            "healthy": heartbeat.healthy,
+            "rtt": heartbeat.rtt,
+            "ping_lost": heartbeat.ping_lost,
+        },
+        "watchdog": {
+            "link_down": watchdog.link_down,
+            "reconnects": watchdog.reconnects,
+            "last_recovery_time": watchdog.last_recovery_time,
+        },
+        "metrics": coordinator.metrics.as_dict(),
+    }
@@ -9,7 +9,7 @@ from homeassistant.components.fan import (
     FanEntityFeature,
 )
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 from homeassistant.helpers.update_coordinator import CoordinatorEntity
 from homeassistant.util.percentage import (
@@ -17,19 +17,17 @@ from homeassistant.util.percentage import (
     percentage_to_ordered_list_item,
 )
 
+from .codec import FAN_SPEED_COUNT, decode, encode_fan
 from .const import (
     DOMAIN,
     CONF_API_KEY,
-    MSG_ON,
-    MSG_OFF,
-    MSG_SEPARATOR,
 )
 from .helpers import BemfaBaseEntity
 
 _LOGGER = logging.getLogger(__name__)
 
 # 风扇速度列表
-SPEED_LIST = [1, 2, 3, 4]
+SPEED_LIST = list(range(1, FAN_SPEED_COUNT + 1))
 
 async def async_setup_entry(
     hass: HomeAssistant,
@@ -40,18 +38,24 @@ async def async_setup_entry(
     coordinator = hass.data[DOMAIN][entry.entry_id]["coordinator"]
     mqtt_client = hass.data[DOMAIN][entry.entry_id]["mqtt_client"]
     
-    entities = [
-        BemfaFan(coordinator, mqtt_client, topic, entry)
-        for topic, device in coordinator.data.items()
-        if device["type"] == "fan"
-    ]
-    
-    if entities:
-        async_add_entities(entities)
+    @callback
+    def async_add_devices(added: set[str], removed: set[str]) -> None:
+        """为新增的主题创建风扇实体, 移除的主题由设备注册表清理."""
+        entities = [
+            BemfaFan(coordinator, mqtt_client, topic, entry)
+            for topic in added
+            if coordinator.data[topic].type == "fan"
+        ]
+        if entities:
+            async_add_entities(entities)
+
+    async_add_devices(coordinator.data.keys(), set())
+    entry.async_on_unload(coordinator.async_add_device_listener(async_add_devices))
 
 class BemfaFan(CoordinatorEntity, BemfaBaseEntity, FanEntity):
     """巴法云风扇设备."""
 
+    _state_attrs = ("_attr_is_on", "_attr_percentage", "_attr_oscillating")
     _attr_has_entity_name = True
     _attr_supported_features = (
         FanEntityFeature.SET_SPEED |
@@ -62,7 +66,8 @@ class BemfaFan(CoordinatorEntity, BemfaBaseEntity, FanEntity):
     def __init__(self, coordinator, mqtt_client, topic, entry):
         """初始化巴法云风扇设备."""
         super().__init__(coordinator)
-        BemfaBaseEntity.__init__(self, topic, coordinator.data[topic]["name"])
+        device = coordinator.data[topic]
+        BemfaBaseEntity.__init__(self, topic, coordinator.get_device_info(topic))
         
         self._topic = topic
         self._mqtt_client = mqtt_client
@@ -70,35 +75,17 @@ class BemfaFan(CoordinatorEntity, BemfaBaseEntity, FanEntity):
         self._attr_unique_id = f"{DOMAIN}_{topic}_fan"
         self._attr_name = "风扇"
         
-        self._parse_state(coordinator.data[topic].get("state", ""))
+        self._parse_state(device.state)
 
     def _parse_state(self, state: str) -> None:
         """解析设备状态."""
-        if not state:
-            self._attr_is_on = False
-            self._attr_percentage = 0
-            self._attr_oscillating = False
-            return
-
-        parts = state.split(MSG_SEPARATOR)
-        self._attr_is_on = parts[0].lower() == MSG_ON
-        
-        if len(parts) > 1 and self._attr_is_on:
-            try:
-                speed = int(parts[1])
-                if 1 <= speed <= 4:
-                    self._attr_percentage = ordered_list_item_to_percentage(SPEED_LIST, speed)
-                else:
-                    self._attr_percentage = 0
-            except (ValueError, IndexError):
-                self._attr_percentage = 0
+        fan = decode("fan", state)
+        self._attr_is_on = fan.is_on
+        if fan.speed:
+            self._attr_percentage = ordered_list_item_to_percentage(SPEED_LIST, fan.speed)
         else:
             self._attr_percentage = 0
-        
-        if len(parts) > 2 and self._attr_is_on:
-            self._attr_oscillating = parts[2] == "1"
-        else:
-            self._attr_oscillating = False
+        self._attr_oscillating = fan.oscillating
 
     async def async_turn_on(
         self,
@@ -111,14 +98,11 @@ class BemfaFan(CoordinatorEntity, BemfaBaseEntity, FanEntity):
             percentage = self.percentage or ordered_list_item_to_percentage(SPEED_LIST, 1)
         
         speed = percentage_to_ordered_list_item(SPEED_LIST, percentage)
-        oscillating = "1" if self.oscillating else "0"
-        
-        msg = f"{MSG_ON}#{speed}#{oscillating}"
-        await self._async_send_command(msg)
+        await self._async_send_command(encode_fan(True, speed, bool(self.oscillating)))
 
     async def async_turn_off(self, **kwargs: Any) -> None:
         """关闭风扇."""
-        await self._async_send_command(MSG_OFF)
+        await self._async_send_command(encode_fan(False))
 
     async def async_set_percentage(self, percentage: int) -> None:
         """设置风扇速度."""
@@ -126,34 +110,34 @@ class BemfaFan(CoordinatorEntity, BemfaBaseEntity, FanEntity):
             await self.async_turn_off()
         else:
             speed = percentage_to_ordered_list_item(SPEED_LIST, percentage)
-            oscillating = "1" if self.oscillating else "0"
-            msg = f"{MSG_ON}#{speed}#{oscillating}"
-            await self._async_send_command(msg)
+            await self._async_send_command(encode_fan(True, speed, bool(self.oscillating)))
 
     async def async_oscillate(self, oscillating: bool) -> None:
         """设置摇头状态."""
         if self.is_on:
             speed = percentage_to_ordered_list_item(SPEED_LIST, self.percentage or 25)
-            msg = f"{MSG_ON}#{speed}#{'1' if oscillating else '0'}"
-            await self._async_send_command(msg)
+            await self._async_send_command(encode_fan(True, speed, oscillating))
 
     async def _async_send_command(self, command: str) -> None:
         """发送命令到巴法云."""
         try:
-            self._mqtt_client.publish(f"{self._topic}/set", command)
+            self._mqtt_client.async_send(
+                f"{self._topic}/set",
+                command,
+                self.coordinator.async_track_command(self._topic, command),
+            )
             self._parse_state(command)
             self.async_write_ha_state()
-            await self.coordinator.async_request_refresh()
         except Exception as ex:
             _LOGGER.error("发送命令失败: %s", ex)
 
     @property
     def available(self) -> bool:
         """返回设备是否可用."""
-        return self.coordinator.data.get(self._topic, {}).get("online", True)
+        device = self.coordinator.data.get(self._topic)
+        return device.online if device is not None else True
 
     def _handle_coordinator_update(self) -> None:
         """处理设备状态更新."""
-        device = self.coordinator.data.get(self._topic, {})
-        self._parse_state(device.get("state", ""))
-        self.hass.loop.call_soon_threadsafe(self.async_write_ha_state)
\ No newline at end of file
+        self._parse_state(self.coordinator.get_state(self._topic))
+        self.async_write_ha_state_if_changed()
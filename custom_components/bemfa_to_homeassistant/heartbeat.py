@@ -0,0 +1,122 @@
+"""巴法云MQTT心跳."""
+from __future__ import annotations
+
+from collections.abc import Callable
+from datetime import timedelta
+from time import monotonic
+from typing import Any
+
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+from homeassistant.helpers.event import async_call_later, async_track_time_interval
+
+from .const import (
+    TOPIC_PING,
+    INTERVAL_PING_SEND,
+    INTERVAL_PING_RECEIVE,
+)
+
+class BemfaHeartbeat:
+    """定时向 TOPIC_PING 发送心跳并等待服务器回传, 用于判断推送链路是否健康."""
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        publish: Callable[[str, str], Any],
+    ) -> None:
+        """初始化心跳."""
+        self._hass = hass
+        self._publish = publish
+        self._listeners: list[CALLBACK_TYPE] = []
+        self._unsub_send: CALLBACK_TYPE | None = None
+        self._unsub_check: CALLBACK_TYPE | None = None
+        self._sent_at = 0.0
+        self._awaiting = False
+        self.ping_lost = 0
+        self.rtt: float | None = None
+        self.last_pong: float | None = None
+
+    @property
+    def healthy(self) -> bool:
+        """返回推送链路是否健康."""
+        return self.last_pong is not None and self.ping_lost == 0
+
+    @callback
+    def async_add_listener(self, update_callback: CALLBACK_TYPE) -> CALLBACK_TYPE:
+        """注册心跳状态变化的监听器."""
+        self._listeners.append(update_callback)
+
+        @callback
+        def remove_listener() -> None:
+            """移除监听器."""
+            self._listeners.remove(update_callback)
+
+        return remove_listener
+
+    @callback
+    def async_start(self) -> None:
+        """开始定时发送心跳, 已经开始时不做任何事."""
+        if self._unsub_send is not None:
+            return
+        self._unsub_send = async_track_time_interval(
+            self._hass, self.async_send_ping, timedelta(seconds=INTERVAL_PING_SEND)
+        )
+        self.async_send_ping()
+
+    @callback
+    def async_stop(self) -> None:
+        """停止发送心跳."""
+        if self._unsub_send is not None:
+            self._unsub_send()
+            self._unsub_send = None
+        if self._unsub_check is not None:
+            self._unsub_check()
+            self._unsub_check = None
+
+    @callback
+    def async_send_ping(self, _now: Any = None) -> None:
+        """发送一次心跳并等待回传."""
+        if self._unsub_check is not None:
+            self._unsub_check()
+        self._sent_at = monotonic()
+        self._awaiting = True
+        self._publish(TOPIC_PING, "ping")
+        self._unsub_check = async_call_later(
+            self._hass, INTERVAL_PING_RECEIVE, self._async_check_pong
+        )
+
+    @callback
+    def _async_check_pong(self, _now: Any) -> None:
+        """心跳超时未回传时计为丢失."""
+        self._unsub_check = None
+        if not self._awaiting:
+            return
+        self._awaiting = False
+        self.ping_lost += 1
+        self._async_notify()
+        # 丢失后立即补发, 使链路故障能在 MAX_PING_LOST 个接收超时内被发现
+        if self._unsub_send is not None:
+            self.async_send_ping()
+
+    @callback
+    def async_pong_received(self) -> None:
+        """收到心跳回传."""
+        if not self._awaiting:
+            return
+        if self._unsub_check is not None:
+            self._unsub_check()
+            self._unsub_check = None
+
+        was_healthy = self.healthy
+        now = monotonic()
+        self._awaiting = False
+        self.rtt = now - self._sent_at
+        self.last_pong = now
+        self.ping_lost = 0
+        if not was_healthy:
+            self._async_notify()
+
+    @callback
+    def _async_notify(self) -> None:
+        """通知所有监听器."""
+        for update_callback in list(self._listeners):
+            update_callback()
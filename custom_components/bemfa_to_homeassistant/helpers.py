@@ -1,15 +1,17 @@
 """巴法云集成的辅助函数."""
 from __future__ import annotations
 
+from collections.abc import Iterable
 from dataclasses import dataclass
 from typing import Final
 
+from homeassistant.core import callback
 from homeassistant.helpers.device_registry import DeviceInfo
 from homeassistant.helpers.entity import Entity
 
 from .const import DOMAIN, MANUFACTURER, MODEL
 
-@dataclass
+@dataclass(slots=True)
 class BemfaDeviceInfo:
     """巴法云设备信息."""
     topic: str
@@ -17,6 +19,171 @@ class BemfaDeviceInfo:
     type: str
     state: str = ""
     online: bool = True
+    generation: int = 0
+
+class BemfaDeviceStore:
+    """巴法云设备状态存储.
+
+    每个主题只保留一条紧凑记录, 只能在事件循环中修改. 每次变更递增该主题的
+    generation, 并记录到变更集合中, 供调用方按主题增量处理而不是复制整个快照.
+    替换设备列表时另外记录新增, 移除和改名的主题, 供调用方增量维护实体和订阅.
+    """
+
+    __slots__ = (
+        "_devices",
+        "_changed",
+        "_added",
+        "_removed",
+        "_renamed",
+        "_missing",
+        "_absent",
+    )
+
+    def __init__(self) -> None:
+        """初始化设备存储."""
+        self._devices: dict[str, BemfaDeviceInfo] = {}
+        self._changed: set[str] = set()
+        self._added: set[str] = set()
+        self._removed: set[str] = set()
+        self._renamed: set[str] = set()
+        # 主题连续未出现在设备列表中的次数
+        self._missing: dict[str, int] = {}
+        # 不在存储中, 但在别处(如设备注册表)仍有记录, 等待确认移除的主题
+        self._absent: set[str] = set()
+
+    def __contains__(self, topic: object) -> bool:
+        """判断主题是否存在."""
+        return topic in self._devices
+
+    def __getitem__(self, topic: str) -> BemfaDeviceInfo:
+        """获取主题对应的设备记录."""
+        return self._devices[topic]
+
+    def __iter__(self):
+        """遍历所有主题."""
+        return iter(self._devices)
+
+    def __len__(self) -> int:
+        """返回设备数量."""
+        return len(self._devices)
+
+    def get(self, topic: str) -> BemfaDeviceInfo | None:
+        """获取主题对应的设备记录."""
+        return self._devices.get(topic)
+
+    def keys(self):
+        """返回所有主题."""
+        return self._devices.keys()
+
+    def items(self):
+        """返回主题与设备记录."""
+        return self._devices.items()
+
+    def values(self):
+        """返回所有设备记录."""
+        return self._devices.values()
+
+    def watch_absent(self, topics: Iterable[str]) -> None:
+        """登记存储中没有的主题, 之后的设备列表按与已有主题相同的规则计数, 确认缺失后报告为移除."""
+        self._absent |= set(topics) - self._devices.keys()
+
+    def update_state(self, topic: str, state: str, online: bool = True) -> bool:
+        """更新单个主题的状态, 返回状态是否发生变化."""
+        device = self._devices.get(topic)
+        if device is None:
+            return False
+        if device.state == state and device.online == online:
+            return False
+
+        device.state = state
+        device.online = online
+        device.generation += 1
+        self._changed.add(topic)
+        return True
+
+    def replace(
+        self,
+        devices: list[BemfaDeviceInfo],
+        remove_after: int = 1,
+    ) -> set[str]:
+        """用一次完整的设备列表替换存储内容, 返回变化的主题集合.
+
+        已存在的记录原地更新以保留generation, 连续 remove_after 次不在列表中的
+        主题才被移除, 之前保持不变; 空列表不计为主题缺失. watch_absent 登记的主题
+        同样计数, 确认缺失后只记录为移除的主题.
+        """
+        changed = set()
+        current = self._devices
+        updated: dict[str, BemfaDeviceInfo] = {}
+
+        for info in devices:
+            device = current.get(info.topic)
+            if device is None:
+                device = info
+                changed.add(info.topic)
+                self._added.add(info.topic)
+            elif (
+                device.name != info.name
+                or device.type != info.type
+                or device.state != info.state
+                or device.online != info.online
+            ):
+                if device.name != info.name:
+                    self._renamed.add(info.topic)
+                device.name = info.name
+                device.type = info.type
+                device.state = info.state
+                device.online = info.online
+                device.generation += 1
+                changed.add(info.topic)
+            updated[info.topic] = device
+
+        for topic in updated:
+            self._missing.pop(topic, None)
+        removed = set()
+        for topic in current.keys() - updated.keys():
+            if not devices:
+                updated[topic] = current[topic]
+                continue
+            missing = self._missing.get(topic, 0) + 1
+            if missing < remove_after:
+                self._missing[topic] = missing
+                updated[topic] = current[topic]
+            else:
+                self._missing.pop(topic, None)
+                removed.add(topic)
+        changed.update(removed)
+        if devices:
+            self._absent -= updated.keys()
+            for topic in list(self._absent):
+                missing = self._missing.get(topic, 0) + 1
+                if missing < remove_after:
+                    self._missing[topic] = missing
+                else:
+                    self._missing.pop(topic, None)
+                    self._absent.discard(topic)
+                    removed.add(topic)
+        self._removed |= removed
+        self._devices = updated
+        self._changed |= changed
+        return changed
+
+    def pop_changed(self) -> set[str]:
+        """返回并清空自上次调用以来变化的主题集合."""
+        changed = self._changed
+        self._changed = set()
+        return changed
+
+    def pop_topic_changes(self) -> tuple[set[str], set[str], set[str]]:
+        """返回并清空自上次调用以来新增, 移除和改名的主题."""
+        devices = self._devices
+        added = {topic for topic in self._added if topic in devices}
+        removed = {topic for topic in self._removed if topic not in devices}
+        renamed = {topic for topic in self._renamed if topic in devices} - added
+        self._added = set()
+        self._removed = set()
+        self._renamed = set()
+        return added, removed, renamed
 
 def get_device_info(topic: str, name: str) -> DeviceInfo:
     """获取设备信息."""
@@ -26,7 +193,6 @@ def get_device_info(topic: str, name: str) -> DeviceInfo:
         manufacturer=MANUFACTURER,
         model=MODEL,
         sw_version="1.0",
-        via_device=(DOMAIN, topic),
     )
 
 class BemfaBaseEntity(Entity):
@@ -34,8 +200,47 @@ class BemfaBaseEntity(Entity):
 
     _attr_should_poll = False
     _attr_has_entity_name = True
+    # 是否由实体自己监听主题消息
+    _listen_topic = True
+    # 组成实体状态的属性, 这些属性和可用性都与上次写入时相同时不再重复写入
+    _state_attrs: tuple[str, ...] = ()
+    _written_state: tuple | None = None
+
+    def __init__(self, topic: str, device_info: DeviceInfo) -> None:
+        """初始化基础实体, 同一主题的实体共享同一个设备信息."""
+        self._topic = topic
+        self._attr_device_info = device_info
+        self._attr_unique_id = f"{DOMAIN}_{topic}"
+
+    async def async_added_to_hass(self) -> None:
+        """实体添加后只订阅自身主题的消息分发."""
+        await super().async_added_to_hass()
+        if not self._listen_topic:
+            return
+        self.async_on_remove(
+            self.coordinator.async_add_topic_listener(
+                self._topic, self._handle_coordinator_update
+            )
+        )
+
+    def _state_key(self) -> tuple:
+        """返回用于判断状态是否变化的快照."""
+        return (
+            self.available,
+            *[getattr(self, name, None) for name in self._state_attrs],
+        )
+
+    @callback
+    def async_write_ha_state(self) -> None:
+        """写入实体状态并计数."""
+        self._written_state = self._state_key()
+        self.coordinator.metrics.state_writes += 1
+        super().async_write_ha_state()
 
-    def __init__(self, topic: str, name: str) -> None:
-        """初始化基础实体."""
-        self._attr_device_info = get_device_info(topic, name)
-        self._attr_unique_id = f"{DOMAIN}_{topic}"
\ No newline at end of file
+    @callback
+    def async_write_ha_state_if_changed(self) -> None:
+        """解析后的状态与上次写入的相同时跳过写入."""
+        if self._state_key() == self._written_state:
+            self.coordinator.metrics.suppressed_writes += 1
+            return
+        self.async_write_ha_state()
@@ -0,0 +1,127 @@
+"""巴法云MQTT消息收件箱."""
+from __future__ import annotations
+
+import asyncio
+import threading
+from collections.abc import Callable
+from time import monotonic
+
+from homeassistant.core import HomeAssistant, callback
+
+from .const import DEFAULT_INBOX_WINDOW, INBOX_MAX_SIZE
+from .metrics import BemfaMetrics
+
+class BemfaInbox:
+    """MQTT线程与事件循环之间的合并收件箱.
+
+    每个主题只保留最新的消息, 一个时间窗口内的所有消息只触发一次事件循环回调.
+    收件箱大小有上限, 超出上限的新主题消息会被丢弃并计数.
+    以暂停状态创建时只收集消息, 直到 async_resume 后才开始处理.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        handler: Callable[[dict[str, str]], None],
+        window: float = DEFAULT_INBOX_WINDOW / 1000,
+        max_size: int = INBOX_MAX_SIZE,
+        metrics: BemfaMetrics | None = None,
+        paused: bool = False,
+    ) -> None:
+        """初始化收件箱."""
+        self._hass = hass
+        self._handler = handler
+        self._window = window
+        self._max_size = max_size
+        self._metrics = metrics or BemfaMetrics()
+        self._lock = threading.Lock()
+        self._pending: dict[str, str] = {}
+        self._received_at: dict[str, float] = {}
+        self._scheduled = False
+        self._timer: asyncio.TimerHandle | None = None
+        self._stopped = False
+        self._paused = paused
+        self.received = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.flushes = 0
+
+    @property
+    def queue_depth(self) -> int:
+        """返回等待处理的主题数量."""
+        return len(self._pending)
+
+    def put(self, topic: str, payload: str) -> None:
+        """放入一条消息, 可在任意线程调用."""
+        if self._stopped:
+            return
+
+        with self._lock:
+            self.received += 1
+            if topic in self._pending:
+                self.coalesced += 1
+            elif len(self._pending) >= self._max_size:
+                self.dropped += 1
+                return
+            self._pending[topic] = payload
+            # 合并的消息从第一条到达时开始计算延迟
+            self._received_at.setdefault(topic, monotonic())
+            if self._scheduled or self._paused:
+                return
+            self._scheduled = True
+
+        self._hass.loop.call_soon_threadsafe(self._async_schedule_flush)
+
+    @callback
+    def _async_schedule_flush(self) -> None:
+        """在事件循环中安排下一次批量处理."""
+        if self._window > 0:
+            self._timer = self._hass.loop.call_later(self._window, self._async_flush)
+        else:
+            self._async_flush()
+
+    @callback
+    def _async_flush(self) -> None:
+        """取出所有待处理消息并交给处理函数."""
+        self._timer = None
+        with self._lock:
+            pending = self._pending
+            received_at = self._received_at
+            self._pending = {}
+            self._received_at = {}
+            self._scheduled = False
+
+        if not pending:
+            return
+        self.flushes += 1
+        metrics = self._metrics
+        metrics.max_queue_depth = max(metrics.max_queue_depth, len(pending))
+        start = monotonic()
+        self._handler(pending)
+        # 处理函数同步写入实体状态, 结束时间即为状态写入时间
+        now = monotonic()
+        metrics.dispatch_time.record(now - start)
+        for timestamp in received_at.values():
+            metrics.ingest_latency.record(now - timestamp)
+
+    @callback
+    def async_resume(self) -> None:
+        """恢复处理, 立即处理暂停期间收集的消息."""
+        with self._lock:
+            self._paused = False
+            if self._scheduled or not self._pending:
+                return
+            self._scheduled = True
+        self._async_schedule_flush()
+
+    @callback
+    def async_stop(self) -> None:
+        """停止收件箱并丢弃未处理的消息."""
+        self._stopped = True
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        with self._lock:
+            self._pending.clear()
+            self._received_at.clear()
+            self._scheduled = False
@@ -0,0 +1,211 @@
+"""巴法云集成的运行指标."""
+from __future__ import annotations
+
+import threading
+from bisect import bisect_left
+from collections import Counter, deque
+from typing import Any
+
+from .const import HISTOGRAM_BUCKETS
+
+class BemfaHistogram:
+    """固定分桶的耗时直方图, 单位为毫秒.
+
+    直方图只在事件循环中写入, 不需要加锁, 记录一次只有一次二分查找和几次加法.
+    """
+
+    __slots__ = ("counts", "count", "total", "max", "last")
+
+    def __init__(self) -> None:
+        """初始化直方图."""
+        self.counts = [0] * (len(HISTOGRAM_BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last: float | None = None
+
+    def record(self, seconds: float) -> None:
+        """记录一次耗时(秒)."""
+        value = seconds * 1000
+        self.counts[bisect_left(HISTOGRAM_BUCKETS, value)] += 1
+        self.count += 1
+        self.total += value
+        self.last = value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, fraction: float) -> float | None:
+        """返回分位数所在分桶的上界, 不超过记录到的最大值."""
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        seen = 0
+        for bound, bucket_count in zip(HISTOGRAM_BUCKETS, self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                return min(bound, round(self.max, 3))
+        return round(self.max, 3)
+
+    def as_dict(self) -> dict[str, Any]:
+        """导出为诊断数据."""
+        buckets = {f"<={bound}": count for bound, count in zip(HISTOGRAM_BUCKETS, self.counts)}
+        buckets[f">{HISTOGRAM_BUCKETS[-1]}"] = self.counts[-1]
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count, 3) if self.count else None,
+            "p50_ms": self.percentile(0.5),
+            "p90_ms": self.percentile(0.9),
+            "p99_ms": self.percentile(0.99),
+            "max_ms": round(self.max, 3),
+            "buckets": buckets,
+        }
+
+class _ThreadCounters:
+    """单个线程独占的计数器, 只由所属线程写入."""
+
+    __slots__ = ("thread", "messages", "connects", "disconnects")
+
+    def __init__(self, thread: threading.Thread) -> None:
+        """初始化计数器."""
+        self.thread = thread
+        self.messages: Counter[str] = Counter()
+        self.connects = 0
+        self.disconnects = 0
+
+class BemfaMetrics:
+    """热路径计数器和耗时直方图, 每个配置条目和每组共享连接各有一份.
+
+    消息和连接计数由各分片的MQTT线程写入, 每个线程写自己的计数器, 不加锁,
+    读取时再汇总; 只有线程第一次写入时登记计数器需要加锁.
+    其余字段和所有直方图都只在事件循环中写入, 只用普通的整数加法, 不加锁.
+    """
+
+    def __init__(self) -> None:
+        """初始化指标."""
+        self._local = threading.local()
+        self._counters_lock = threading.Lock()
+        self._counters: list[_ThreadCounters] = []
+        self._retired = _ThreadCounters(threading.current_thread())
+        self.state_writes = 0
+        self.suppressed_writes = 0
+        self.filtered_values = 0
+        self.polls = 0
+        self.poll_failures = 0
+        self.last_poll_success: float | None = None
+        self.publishes = 0
+        self.commands = 0
+        self.max_queue_depth = 0
+        self.poll_duration = BemfaHistogram()
+        self.parse_time = BemfaHistogram()
+        self.dispatch_time = BemfaHistogram()
+        self.ingest_latency = BemfaHistogram()
+        self.command_latency = BemfaHistogram()
+        self.ack_timeouts = 0
+        self.command_retries = 0
+        self.command_failures = 0
+        self.ack_latency = BemfaHistogram()
+        self.ack_latency_by_topic: dict[str, BemfaHistogram] = {}
+
+    def _thread_counters(self) -> _ThreadCounters:
+        """返回当前线程的计数器, 第一次调用时登记."""
+        try:
+            return self._local.counters
+        except AttributeError:
+            pass
+        counters = self._local.counters = _ThreadCounters(threading.current_thread())
+        with self._counters_lock:
+            # 重连会换新的MQTT线程, 把已退出线程的计数并入汇总, 列表不会一直增长
+            for old in [old for old in self._counters if not old.thread.is_alive()]:
+                self._counters.remove(old)
+                self._retired.messages.update(old.messages)
+                self._retired.connects += old.connects
+                self._retired.disconnects += old.disconnects
+            self._counters.append(counters)
+        return counters
+
+    def _snapshot(self) -> list[_ThreadCounters]:
+        """返回所有计数器, 包括已退出线程的汇总."""
+        with self._counters_lock:
+            return [self._retired, *self._counters]
+
+    def count_message(self, kind: str) -> None:
+        """累加一条收到的消息, 可在任意线程调用."""
+        self._thread_counters().messages[kind] += 1
+
+    def count_connect(self) -> None:
+        """累加一次连接成功, 可在任意线程调用."""
+        self._thread_counters().connects += 1
+
+    def count_disconnect(self) -> None:
+        """累加一次连接断开, 可在任意线程调用."""
+        self._thread_counters().disconnects += 1
+
+    @property
+    def connects(self) -> int:
+        """连接成功次数."""
+        return sum(counters.connects for counters in self._snapshot())
+
+    @property
+    def disconnects(self) -> int:
+        """连接断开次数."""
+        return sum(counters.disconnects for counters in self._snapshot())
+
+    def message_counts(self) -> dict[str, int]:
+        """返回按类型的消息计数快照."""
+        total: Counter[str] = Counter()
+        for counters in self._snapshot():
+            total.update(dict(counters.messages))
+        return dict(total)
+
+    def record_ack(self, topic: str, seconds: float) -> None:
+        """记录一条命令从发布到收到确认的耗时."""
+        self.ack_latency.record(seconds)
+        if (histogram := self.ack_latency_by_topic.get(topic)) is None:
+            histogram = self.ack_latency_by_topic[topic] = BemfaHistogram()
+        histogram.record(seconds)
+
+    def as_dict(self) -> dict[str, Any]:
+        """导出为诊断数据."""
+        return {
+            "messages": self.message_counts(),
+            "state_writes": self.state_writes,
+            "suppressed_writes": self.suppressed_writes,
+            "filtered_values": self.filtered_values,
+            "polls": self.polls,
+            "poll_failures": self.poll_failures,
+            "publishes": self.publishes,
+            "commands": self.commands,
+            "connects": self.connects,
+            "disconnects": self.disconnects,
+            "max_queue_depth": self.max_queue_depth,
+            "poll_duration": self.poll_duration.as_dict(),
+            "parse_time": self.parse_time.as_dict(),
+            "dispatch_time": self.dispatch_time.as_dict(),
+            "ingest_to_state_write": self.ingest_latency.as_dict(),
+            "command_to_publish": self.command_latency.as_dict(),
+            "ack_timeouts": self.ack_timeouts,
+            "command_retries": self.command_retries,
+            "command_failures": self.command_failures,
+            "publish_to_ack": self.ack_latency.as_dict(),
+            "publish_to_ack_by_topic": {
+                topic: histogram.as_dict()
+                for topic, histogram in self.ack_latency_by_topic.items()
+            },
+        }
+
+class BemfaRateWindow:
+    """按固定间隔采样累计计数, 计算滑动窗口内的每分钟速率."""
+
+    __slots__ = ("_samples",)
+
+    def __init__(self, size: int) -> None:
+        """初始化窗口, size 为保留的采样数."""
+        self._samples: deque[tuple[float, int]] = deque(maxlen=size)
+
+    def add(self, timestamp: float, total: int) -> float | None:
+        """加入一次采样, 返回窗口内的每分钟速率, 采样不足时返回 None."""
+        self._samples.append((timestamp, total))
+        (start, first), (end, last) = self._samples[0], self._samples[-1]
+        if end <= start:
+            return None
+        return (last - first) * 60 / (end - start)
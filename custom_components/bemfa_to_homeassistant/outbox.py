@@ -0,0 +1,234 @@
+"""巴法云MQTT命令发件箱."""
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections.abc import Callable
+from dataclasses import dataclass
+from functools import partial
+from math import inf
+from time import monotonic
+from typing import Any
+
+from homeassistant.core import HomeAssistant, callback
+
+from .api import BemfaTokenBucket
+from .const import (
+    COMMAND_WINDOW,
+    COMMAND_RATE,
+    COMMAND_BURST,
+    COMMAND_TOPIC_INTERVAL,
+    DEFAULT_COMMAND_QOS,
+    COMMAND_ACK_TIMEOUT,
+    COMMAND_MAX_RETRIES,
+)
+from .metrics import BemfaMetrics
+
+_LOGGER = logging.getLogger(__name__)
+
+@dataclass(slots=True)
+class _Inflight:
+    """一条已发布但尚未确认的命令."""
+    payload: str
+    sent_at: float
+    attempt: int
+    mid: int = 0
+    timeout: asyncio.TimerHandle | None = None
+
+class BemfaOutbox:
+    """事件循环中的控制命令发件箱.
+
+    同一主题在等待期间只保留最新的一条命令, 实体发送的是完整状态, 因此连续调整
+    多个属性会合并成一条. 命令在合并窗口结束并且距离该主题上次发送超过最小间隔后
+    发出, 所有主题共用一个令牌桶限制总的发送速率, 超出速率的命令继续等待并合并.
+
+    QoS 大于 0 时每条命令都等待服务器确认, 超时后重新放入发件箱, 最多重发
+    max_retries 次; 期间同一主题有了更新的命令时不再重发旧命令. 每条命令在确认
+    或超时后都通过 discard_ack 让连接释放其报文ID对应的确认回调.
+    命令内容是设备的完整状态, 重复送达不会改变结果.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        publish: Callable[..., Any],
+        window: float = COMMAND_WINDOW,
+        rate: float = COMMAND_RATE,
+        burst: int = COMMAND_BURST,
+        topic_interval: float = COMMAND_TOPIC_INTERVAL,
+        qos: int = DEFAULT_COMMAND_QOS,
+        ack_timeout: float = COMMAND_ACK_TIMEOUT,
+        max_retries: int = COMMAND_MAX_RETRIES,
+        metrics: BemfaMetrics | None = None,
+        discard_ack: Callable[[str, int], None] | None = None,
+    ) -> None:
+        """初始化发件箱."""
+        self._hass = hass
+        self._publish = publish
+        self._discard_ack = discard_ack
+        self._window = window
+        self._topic_interval = topic_interval
+        self._qos = qos
+        self._ack_timeout = ack_timeout
+        self._max_retries = max_retries
+        self._limiter = BemfaTokenBucket(rate, burst)
+        self._metrics = metrics or BemfaMetrics()
+        self._pending: dict[str, str] = {}
+        self._due: dict[str, float] = {}
+        self._queued_at: dict[str, float] = {}
+        self._last_sent: dict[str, float] = {}
+        self._attempts: dict[str, int] = {}
+        self._on_publish: dict[str, Callable[[], None]] = {}
+        self._inflight: dict[str, _Inflight] = {}
+        self._timer: asyncio.TimerHandle | None = None
+        self._timer_at = inf
+        self.queued = 0
+        self.coalesced = 0
+        self.sent = 0
+        self.rate_limited = 0
+
+    @property
+    def queue_depth(self) -> int:
+        """返回等待发送的主题数量."""
+        return len(self._pending)
+
+    @property
+    def inflight(self) -> int:
+        """返回已发布但尚未确认的命令数量."""
+        return len(self._inflight)
+
+    @callback
+    def async_send(
+        self,
+        topic: str,
+        payload: str,
+        on_publish: Callable[[], None] | None = None,
+    ) -> None:
+        """放入一条命令, 同一主题尚未发出的旧命令被替换.
+
+        on_publish 在命令离开发件箱时调用, 被替换的旧命令的回调不再调用.
+        """
+        self.queued += 1
+        self._attempts.pop(topic, None)
+        if on_publish is not None:
+            self._on_publish[topic] = on_publish
+        else:
+            self._on_publish.pop(topic, None)
+        self._async_enqueue(topic, payload)
+
+    @callback
+    def _async_enqueue(self, topic: str, payload: str) -> None:
+        """把命令放入等待队列."""
+        if topic in self._pending:
+            self.coalesced += 1
+        else:
+            now = monotonic()
+            self._queued_at[topic] = now
+            self._due[topic] = max(
+                now + self._window,
+                self._last_sent.get(topic, -inf) + self._topic_interval,
+            )
+            self._async_schedule(self._due[topic])
+        self._pending[topic] = payload
+
+    @callback
+    def _async_schedule(self, when: float) -> None:
+        """安排在 when 时刻处理, 已有更早的安排时不重复安排."""
+        if self._timer is not None:
+            if self._timer_at <= when:
+                return
+            self._timer.cancel()
+        self._timer_at = when
+        self._timer = self._hass.loop.call_later(
+            max(0.0, when - monotonic()), self._async_flush
+        )
+
+    @callback
+    def _async_flush(self) -> None:
+        """按进入发件箱的顺序发出所有到期的命令, 令牌不足时稍后继续."""
+        self._timer = None
+        self._timer_at = inf
+        now = monotonic()
+        retry_at = 0.0
+        for topic in [topic for topic, due in self._due.items() if due <= now]:
+            if (delay := self._limiter.try_acquire()) > 0:
+                self.rate_limited += 1
+                retry_at = now + delay
+                break
+
+            payload = self._pending.pop(topic)
+            del self._due[topic]
+            queued_at = self._queued_at.pop(topic)
+            self._last_sent[topic] = now
+            self._async_publish(topic, payload, self._attempts.pop(topic, 0))
+            self._metrics.command_latency.record(monotonic() - queued_at)
+            if (on_publish := self._on_publish.pop(topic, None)) is not None:
+                on_publish()
+
+        if self._due:
+            self._async_schedule(max(retry_at, min(self._due.values())))
+
+    @callback
+    def _async_publish(self, topic: str, payload: str, attempt: int) -> None:
+        """发布一条命令, QoS 大于 0 时开始等待确认."""
+        # 旧命令已被新命令取代, 不再重发, 其确认仍计入统计, 超时后释放确认回调
+        self._inflight.pop(topic, None)
+        inflight = _Inflight(payload, monotonic(), attempt)
+        on_ack = partial(self._async_acked, topic, inflight) if self._qos else None
+        try:
+            info = self._publish(topic, payload, self._qos, on_ack)
+        except Exception as err:
+            _LOGGER.error("发送命令失败: %s", err)
+            return
+        self.sent += 1
+        if self._qos:
+            inflight.mid = info.mid
+            self._inflight[topic] = inflight
+            inflight.timeout = self._hass.loop.call_later(
+                self._ack_timeout, self._async_ack_timeout, topic, inflight
+            )
+
+    @callback
+    def _async_acked(self, topic: str, inflight: _Inflight) -> None:
+        """收到服务器确认."""
+        self._metrics.record_ack(topic, monotonic() - inflight.sent_at)
+        inflight.timeout.cancel()
+        if self._inflight.get(topic) is inflight:
+            del self._inflight[topic]
+
+    @callback
+    def _async_ack_timeout(self, topic: str, inflight: _Inflight) -> None:
+        """确认超时, 释放确认回调, 没有更新的命令时重新放入发件箱."""
+        if self._discard_ack is not None:
+            self._discard_ack(topic, inflight.mid)
+        if self._inflight.get(topic) is not inflight:
+            return
+        del self._inflight[topic]
+        self._metrics.ack_timeouts += 1
+        if topic in self._pending:
+            return
+        if inflight.attempt >= self._max_retries:
+            self._metrics.command_failures += 1
+            _LOGGER.warning(
+                "主题 %s 的命令重发 %d 次后仍未确认", topic, inflight.attempt
+            )
+            return
+        self._metrics.command_retries += 1
+        self._attempts[topic] = inflight.attempt + 1
+        self._async_enqueue(topic, inflight.payload)
+
+    @callback
+    def async_stop(self) -> None:
+        """停止发件箱并丢弃未发出的命令."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._timer_at = inf
+        self._pending.clear()
+        self._due.clear()
+        self._queued_at.clear()
+        self._attempts.clear()
+        self._on_publish.clear()
+        for inflight in self._inflight.values():
+            inflight.timeout.cancel()
+        self._inflight.clear()
@@ -0,0 +1,64 @@
+"""巴法云链路性能采样."""
+from __future__ import annotations
+
+import logging
+from datetime import timedelta
+from time import monotonic
+from typing import Any
+
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.update_coordinator import DataUpdateCoordinator
+
+from .const import PERF_SENSOR_INTERVAL, PERF_SENSOR_WINDOW
+from .connection import BemfaConnectionManager
+from .metrics import BemfaRateWindow
+
+_LOGGER = logging.getLogger(__name__)
+
+class BemfaPerfCoordinator(DataUpdateCoordinator[dict[str, Any]]):
+    """按固定的低频率从内存指标中采样链路性能.
+
+    只读取已有的计数器和心跳结果, 不产生任何网络请求; 只有传感器存在时才会定时采样.
+    """
+
+    def __init__(
+        self, hass: HomeAssistant, coordinator, mqtt_client: BemfaConnectionManager
+    ) -> None:
+        """初始化性能采样."""
+        super().__init__(
+            hass,
+            _LOGGER,
+            name="bemfa_perf",
+            update_interval=timedelta(seconds=PERF_SENSOR_INTERVAL),
+            always_update=False,
+        )
+        self._coordinator = coordinator
+        self._mqtt_client = mqtt_client
+        size = PERF_SENSOR_WINDOW // PERF_SENSOR_INTERVAL + 1
+        self._messages = BemfaRateWindow(size)
+        self._commands = BemfaRateWindow(size)
+
+    async def _async_update_data(self) -> dict[str, Any]:
+        """采样一次."""
+        metrics = self._coordinator.metrics
+        now = monotonic()
+        messages = sum(metrics.message_counts().values())
+        messages_rate = self._messages.add(now, messages)
+        commands_rate = self._commands.add(now, self._mqtt_client.metrics.commands)
+        rtt = self._mqtt_client.heartbeat.rtt
+        poll_duration = metrics.poll_duration.last
+        last_poll = metrics.last_poll_success
+
+        return {
+            "rtt": round(rtt * 1000, 1) if rtt is not None else None,
+            "messages_per_min": (
+                round(messages_rate, 1) if messages_rate is not None else None
+            ),
+            "commands_per_min": (
+                round(commands_rate, 1) if commands_rate is not None else None
+            ),
+            "poll_duration": (
+                round(poll_duration, 1) if poll_duration is not None else None
+            ),
+            "poll_age": round(now - last_poll) if last_poll is not None else None,
+        }
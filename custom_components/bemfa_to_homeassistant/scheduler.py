@@ -0,0 +1,26 @@
+"""巴法云REST轮询调度."""
+from __future__ import annotations
+
+from datetime import timedelta
+
+from .const import DEFAULT_SCAN_INTERVAL, PUSH_HEALTHY_SCAN_INTERVAL
+
+class BemfaPollScheduler:
+    """根据MQTT推送健康状况调整REST轮询间隔.
+
+    推送健康时只以很长的间隔做兜底轮询, 推送异常时立即收紧到默认间隔.
+    alltopic 接口一次返回所有主题, 无法按设备类型分别请求, 因此不区分设备类型.
+    """
+
+    def __init__(self) -> None:
+        """初始化轮询调度."""
+        self.push_healthy = False
+
+    @property
+    def update_interval(self) -> timedelta | None:
+        """返回当前的轮询间隔, 为 None 时只依赖推送."""
+        if self.push_healthy:
+            if PUSH_HEALTHY_SCAN_INTERVAL is None:
+                return None
+            return timedelta(seconds=PUSH_HEALTHY_SCAN_INTERVAL)
+        return timedelta(seconds=DEFAULT_SCAN_INTERVAL)
@@ -18,19 +18,34 @@ from homeassistant.const import (
     PERCENTAGE,
     LIGHT_LUX,
     CONCENTRATION_MICROGRAMS_PER_CUBIC_METER,
+    EntityCategory,
     UnitOfTemperature,
+    UnitOfTime,
 )
-from homeassistant.core import HomeAssistant
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+from homeassistant.helpers.device_registry import DeviceEntryType, DeviceInfo
+from homeassistant.helpers.entity import Entity
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 from homeassistant.helpers.update_coordinator import CoordinatorEntity
 
+from .codec import SensorState, decode
 from .const import (
     DOMAIN,
     CONF_API_KEY,
-    MSG_SEPARATOR,
-    MSG_ON,
+    CONF_PERF_SENSORS,
+    DEFAULT_PERF_SENSORS,
+    CONF_SENSOR_DEADBANDS,
+    DEFAULT_SENSOR_DEADBANDS,
+    CONF_SENSOR_MIN_INTERVAL,
+    DEFAULT_SENSOR_MIN_INTERVAL,
+    CONF_SENSOR_MAX_AGE,
+    DEFAULT_SENSOR_MAX_AGE,
+    MANUFACTURER,
+    SENSOR_DEADBANDS,
 )
+from .deadband import BemfaDeadband, parse_deadbands
 from .helpers import BemfaBaseEntity
+from .perf import BemfaPerfCoordinator
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -77,6 +92,34 @@ SENSOR_TYPES = {
     },
 }
 
+PERF_SENSOR_TYPES = {
+    "rtt": {
+        "name": "心跳往返时间",
+        "device_class": SensorDeviceClass.DURATION,
+        "unit": UnitOfTime.MILLISECONDS,
+    },
+    "messages_per_min": {
+        "name": "上行消息速率",
+        "device_class": None,
+        "unit": "msg/min",
+    },
+    "commands_per_min": {
+        "name": "下行命令速率",
+        "device_class": None,
+        "unit": "cmd/min",
+    },
+    "poll_duration": {
+        "name": "轮询耗时",
+        "device_class": SensorDeviceClass.DURATION,
+        "unit": UnitOfTime.MILLISECONDS,
+    },
+    "poll_age": {
+        "name": "距上次成功轮询",
+        "device_class": SensorDeviceClass.DURATION,
+        "unit": UnitOfTime.SECONDS,
+    },
+}
+
 async def async_setup_entry(
     hass: HomeAssistant,
     entry: ConfigEntry,
@@ -86,47 +129,158 @@ async def async_setup_entry(
     coordinator = hass.data[DOMAIN][entry.entry_id]["coordinator"]
     mqtt_client = hass.data[DOMAIN][entry.entry_id]["mqtt_client"]
     
-    entities = []
-    for topic, device in coordinator.data.items():
-        if device["type"] == "sensor":
-            state = device.get("state", "")
-            parts = state.split(MSG_SEPARATOR) if state else []
-            
-            entities.append(
-                BemfaSensor(coordinator, mqtt_client, topic, entry, "temperature", SENSOR_TYPES["temperature"])
+    sensor_devices: dict[str, CALLBACK_TYPE] = {}
+    # 选项中的死区覆盖默认值, 键为传感器类型或实体ID
+    deadbands = {
+        **SENSOR_DEADBANDS,
+        **parse_deadbands(
+            entry.options.get(CONF_SENSOR_DEADBANDS, DEFAULT_SENSOR_DEADBANDS)
+        ),
+    }
+
+    @callback
+    def async_create_devices(added: set[str]) -> list[Entity]:
+        """为新增的传感器主题创建设备, 返回其子实体."""
+        entities: list[Entity] = []
+        for topic in added:
+            if coordinator.data[topic].type != "sensor" or topic in sensor_devices:
+                continue
+            sensor_device = BemfaSensorDevice(
+                coordinator, mqtt_client, topic, entry, async_add_entities, deadbands
             )
-            
-            if len(parts) > 2:
-                entities.append(
-                    BemfaSensor(coordinator, mqtt_client, topic, entry, "humidity", SENSOR_TYPES["humidity"])
-                )
-            
-            if len(parts) > 3:
-                entities.append(
-                    BemfaBinarySensor(coordinator, mqtt_client, topic, entry, "switch", SENSOR_TYPES["switch"])
-                )
-            
-            if len(parts) > 4:
-                entities.append(
-                    BemfaSensor(coordinator, mqtt_client, topic, entry, "illuminance", SENSOR_TYPES["illuminance"])
-                )
-            
-            if len(parts) > 5:
-                entities.append(
-                    BemfaSensor(coordinator, mqtt_client, topic, entry, "pm25", SENSOR_TYPES["pm25"])
-                )
-            
-            if len(parts) > 6:
-                entities.append(
-                    BemfaSensor(coordinator, mqtt_client, topic, entry, "heart_rate", SENSOR_TYPES["heart_rate"])
-                )
+            entities.extend(sensor_device.async_discover())
+            sensor_devices[topic] = sensor_device.async_start()
+        return entities
+
+    @callback
+    def async_devices_changed(added: set[str], removed: set[str]) -> None:
+        """停止已移除主题的监听, 为新增的主题创建实体."""
+        for topic in removed:
+            if (stop := sensor_devices.pop(topic, None)) is not None:
+                stop()
+        if entities := async_create_devices(added):
+            async_add_entities(entities)
+
+    @callback
+    def async_stop_devices() -> None:
+        """停止所有传感器设备的监听."""
+        for stop in sensor_devices.values():
+            stop()
+        sensor_devices.clear()
+
+    entities = async_create_devices(coordinator.data.keys())
+    entry.async_on_unload(async_stop_devices)
+    entry.async_on_unload(coordinator.async_add_device_listener(async_devices_changed))
+
+    if entry.options.get(CONF_PERF_SENSORS, DEFAULT_PERF_SENSORS):
+        perf_coordinator = BemfaPerfCoordinator(
+            hass, coordinator, hass.data[DOMAIN][entry.entry_id]["mqtt_client"]
+        )
+        await perf_coordinator.async_refresh()
+        entities.extend(
+            BemfaPerfSensor(perf_coordinator, entry, sensor_type, config)
+            for sensor_type, config in PERF_SENSOR_TYPES.items()
+        )
     
     if entities:
         async_add_entities(entities)
 
+class BemfaSensorDevice:
+    """巴法云传感器设备.
+
+    每个主题只注册一个监听器, 消息只解析一次, 然后只更新字段发生变化的子实体.
+    设备开始上报更多字段时, 在运行时添加对应的子实体, 无需重新加载集成.
+    """
+
+    def __init__(
+        self, coordinator, mqtt_client, topic, entry, async_add_entities, deadbands
+    ):
+        """初始化巴法云传感器设备."""
+        self._coordinator = coordinator
+        self._mqtt_client = mqtt_client
+        self._topic = topic
+        self._entry = entry
+        self._async_add_entities = async_add_entities
+        self._deadbands = deadbands
+        self._entities: dict[str, BemfaSensor | BemfaBinarySensor] = {}
+        self._last_state: SensorState | None = None
+        self._last_online: bool | None = None
+
+    @callback
+    def async_start(self) -> CALLBACK_TYPE:
+        """开始监听主题, 返回停止函数."""
+        device = self._coordinator.data.get(self._topic)
+        self._last_state = decode("sensor", device.state if device is not None else "")
+        self._last_online = device.online if device is not None else True
+        return self._coordinator.async_add_topic_listener(
+            self._topic, self._async_handle_update
+        )
+
+    @callback
+    def async_discover(self) -> list[BemfaSensor | BemfaBinarySensor]:
+        """根据当前消息的字段数创建尚不存在的子实体."""
+        device = self._coordinator.data.get(self._topic)
+        fields = decode("sensor", device.state if device is not None else "").fields
+
+        entities = []
+        for sensor_type, config in SENSOR_TYPES.items():
+            if sensor_type in self._entities:
+                continue
+            if sensor_type != "temperature" and fields <= config["index"]:
+                continue
+            if sensor_type == "switch":
+                entity = BemfaBinarySensor(
+                    self._coordinator,
+                    self._mqtt_client,
+                    self._topic,
+                    self._entry,
+                    sensor_type,
+                    config,
+                )
+            else:
+                entity = BemfaSensor(
+                    self._coordinator,
+                    self._mqtt_client,
+                    self._topic,
+                    self._entry,
+                    sensor_type,
+                    config,
+                    self._deadbands,
+                )
+            self._entities[sensor_type] = entity
+            entities.append(entity)
+        return entities
+
+    @callback
+    def _async_handle_update(self) -> None:
+        """处理主题消息, 只写入发生变化的子实体, 可用性变化时跳过数值过滤."""
+        device = self._coordinator.data.get(self._topic)
+        state = decode("sensor", device.state if device is not None else "")
+        online = device.online if device is not None else True
+
+        last_state = self._last_state
+        online_changed = online != self._last_online
+        for sensor_type, entity in self._entities.items():
+            value = getattr(state, sensor_type)
+            if (
+                online_changed
+                or last_state is None
+                or getattr(last_state, sensor_type) != value
+            ):
+                entity.async_set_value(value, online_changed)
+        self._last_state = state
+        self._last_online = online
+
+        if new_entities := self.async_discover():
+            self._async_add_entities(new_entities)
+
 class BemfaSensor(CoordinatorEntity, BemfaBaseEntity, SensorEntity):
     """巴法云传感器设备."""
 
+    _state_attrs = ("_attr_native_value",)
+    # 主题消息由 BemfaSensorDevice 统一分发
+    _listen_topic = False
+
     def __init__(
         self,
         coordinator,
@@ -135,10 +289,12 @@ class BemfaSensor(CoordinatorEntity, BemfaBaseEntity, SensorEntity):
         entry,
         sensor_type: str,
         config: dict,
+        deadbands: dict[str, tuple[float, float]] | None = None,
     ):
         """初始化巴法云传感器设备."""
         super().__init__(coordinator)
-        BemfaBaseEntity.__init__(self, topic, coordinator.data[topic]["name"])
+        device = coordinator.data[topic]
+        BemfaBaseEntity.__init__(self, topic, coordinator.get_device_info(topic))
         
         self._topic = topic
         self._mqtt_client = mqtt_client
@@ -151,44 +307,77 @@ class BemfaSensor(CoordinatorEntity, BemfaBaseEntity, SensorEntity):
         self._attr_native_unit_of_measurement = config.get("unit")
         self._attr_device_class = config.get("device_class")
         self._attr_state_class = config.get("state_class")
+        self._entry = entry
+        self._deadbands = deadbands or {}
+        self._deadband: BemfaDeadband | None = None
         
-        self._parse_state(coordinator.data[topic].get("state", ""))
+        self._parse_state(device.state)
 
     def _parse_state(self, state: str) -> None:
         """解析设备状态."""
-        if not state:
-            self._attr_native_value = None
+        self._attr_native_value = getattr(decode("sensor", state), self._sensor_type)
+
+    async def async_added_to_hass(self) -> None:
+        """实体添加后创建数值过滤器, 实体ID的死区优先于传感器类型的死区."""
+        await super().async_added_to_hass()
+        absolute, relative = self._deadbands.get(
+            self.entity_id, self._deadbands.get(self._sensor_type, (0.0, 0.0))
+        )
+        options = self._entry.options
+        self._deadband = BemfaDeadband(
+            self.hass,
+            self._async_write_value,
+            absolute,
+            relative,
+            options.get(CONF_SENSOR_MIN_INTERVAL, DEFAULT_SENSOR_MIN_INTERVAL),
+            options.get(CONF_SENSOR_MAX_AGE, DEFAULT_SENSOR_MAX_AGE),
+            self.coordinator.metrics,
+        )
+        self._deadband.async_reset(self._attr_native_value)
+        self.async_on_remove(self._deadband.async_stop)
+
+    @callback
+    def async_set_value(self, value: float | None, force: bool = False) -> None:
+        """由所属设备写入新的数值, 经过死区和最小间隔过滤."""
+        if self._deadband is None:
+            self._attr_native_value = value
+            return
+        if force:
+            self._deadband.async_reset(value)
+            self._async_write_value(value)
             return
+        self._deadband.async_update(value)
 
-        parts = state.split(MSG_SEPARATOR)
-        index = self._config["index"]
-        
-        if len(parts) > index:
-            try:
-                value = parts[index].strip()
-                if value:
-                    self._attr_native_value = float(value)
-                else:
-                    self._attr_native_value = None
-            except (ValueError, IndexError):
-                self._attr_native_value = None
-        else:
-            self._attr_native_value = None
+    @callback
+    def _async_write_value(self, value: float | None) -> None:
+        """写入过滤后的数值."""
+        self._attr_native_value = value
+        self.async_write_ha_state()
 
     @property
     def available(self) -> bool:
         """返回设备是否可用."""
-        return self.coordinator.data.get(self._topic, {}).get("online", True)
+        device = self.coordinator.data.get(self._topic)
+        return device.online if device is not None else True
 
+    @callback
     def _handle_coordinator_update(self) -> None:
-        """处理设备状态更新."""
-        device = self.coordinator.data.get(self._topic, {})
-        self._parse_state(device.get("state", ""))
-        self.hass.loop.call_soon_threadsafe(self.async_write_ha_state)
+        """处理设备状态更新, 同样经过数值过滤, 只在可用性变化时强制写入."""
+        device = self.coordinator.data.get(self._topic)
+        value = getattr(
+            decode("sensor", device.state if device is not None else ""),
+            self._sensor_type,
+        )
+        written = self._written_state
+        self.async_set_value(value, written is None or written[0] != self.available)
 
 class BemfaBinarySensor(CoordinatorEntity, BemfaBaseEntity, BinarySensorEntity):
     """巴法云二进制传感器设备."""
 
+    _state_attrs = ("_attr_is_on",)
+    # 主题消息由 BemfaSensorDevice 统一分发
+    _listen_topic = False
+
     def __init__(
         self,
         coordinator,
@@ -200,7 +389,8 @@ class BemfaBinarySensor(CoordinatorEntity, BemfaBaseEntity, BinarySensorEntity):
     ):
         """初始化巴法云二进制传感器设备."""
         super().__init__(coordinator)
-        BemfaBaseEntity.__init__(self, topic, coordinator.data[topic]["name"])
+        device = coordinator.data[topic]
+        BemfaBaseEntity.__init__(self, topic, coordinator.get_device_info(topic))
         
         self._topic = topic
         self._mqtt_client = mqtt_client
@@ -212,30 +402,65 @@ class BemfaBinarySensor(CoordinatorEntity, BemfaBaseEntity, BinarySensorEntity):
         self._attr_name = config["name"]
         self._attr_device_class = config.get("device_class")
         
-        self._parse_state(coordinator.data[topic].get("state", ""))
+        self._parse_state(device.state)
 
     def _parse_state(self, state: str) -> None:
         """解析设备状态."""
-        if not state:
-            self._attr_is_on = None
-            return
+        self._attr_is_on = getattr(decode("sensor", state), self._sensor_type)
 
-        parts = state.split(MSG_SEPARATOR)
-        index = self._config["index"]
-        
-        if len(parts) > index:
-            value = parts[index].strip().lower()
-            self._attr_is_on = bool(value) and value == MSG_ON
-        else:
-            self._attr_is_on = None
+    @callback
+    def async_set_value(self, value: bool | None, force: bool = False) -> None:
+        """由所属设备写入新的状态, 开关状态不做过滤."""
+        self._attr_is_on = value
+        if self.hass is not None:
+            self.async_write_ha_state()
 
     @property
     def available(self) -> bool:
         """返回设备是否可用."""
-        return self.coordinator.data.get(self._topic, {}).get("online", True)
+        device = self.coordinator.data.get(self._topic)
+        return device.online if device is not None else True
 
     def _handle_coordinator_update(self) -> None:
         """处理设备状态更新."""
-        device = self.coordinator.data.get(self._topic, {})
-        self._parse_state(device.get("state", ""))
-        self.hass.loop.call_soon_threadsafe(self.async_write_ha_state)
\ No newline at end of file
+        device = self.coordinator.data.get(self._topic)
+        self._parse_state(device.state if device is not None else "")
+        self.async_write_ha_state_if_changed()
+
+class BemfaPerfSensor(CoordinatorEntity, SensorEntity):
+    """巴法云链路性能诊断传感器."""
+
+    _attr_has_entity_name = True
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_state_class = SensorStateClass.MEASUREMENT
+
+    def __init__(
+        self,
+        coordinator: BemfaPerfCoordinator,
+        entry: ConfigEntry,
+        sensor_type: str,
+        config: dict,
+    ):
+        """初始化性能诊断传感器."""
+        super().__init__(coordinator)
+        self._sensor_type = sensor_type
+
+        self._attr_unique_id = f"{DOMAIN}_{entry.entry_id}_{sensor_type}"
+        self._attr_name = config["name"]
+        self._attr_native_unit_of_measurement = config.get("unit")
+        self._attr_device_class = config.get("device_class")
+        self._attr_device_info = DeviceInfo(
+            identifiers={(DOMAIN, entry.entry_id)},
+            name=entry.title,
+            manufacturer=MANUFACTURER,
+            entry_type=DeviceEntryType.SERVICE,
+        )
+        self._attr_native_value = coordinator.data.get(sensor_type)
+
+    def _handle_coordinator_update(self) -> None:
+        """采样结果变化时才写入状态."""
+        value = self.coordinator.data.get(self._sensor_type)
+        if value == self._attr_native_value:
+            return
+        self._attr_native_value = value
+        self.async_write_ha_state()
@@ -0,0 +1,194 @@
+"""巴法云集成的服务."""
+from __future__ import annotations
+
+from collections import defaultdict
+from collections.abc import Mapping
+from typing import Any
+
+import voluptuous as vol
+
+from homeassistant.const import ATTR_ENTITY_ID
+from homeassistant.core import HomeAssistant, ServiceCall, callback
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.helpers import config_validation as cv
+from homeassistant.helpers import device_registry as dr
+from homeassistant.helpers import entity_registry as er
+from homeassistant.util.percentage import percentage_to_ordered_list_item
+
+from .codec import (
+    COVER_PAUSE,
+    FAN_MODES_REVERSE,
+    FAN_SPEED_COUNT,
+    HVAC_MODES_REVERSE,
+    MIN_KELVIN,
+    MIN_TEMP,
+    SWING_MODES_REVERSE,
+    decode,
+    encode_climate,
+    encode_cover,
+    encode_fan,
+    encode_light,
+    encode_switch,
+)
+from .const import DOMAIN, MSG_ON, MSG_OFF
+
+SERVICE_SEND_BATCH = "send_batch"
+
+ATTR_COMMANDS = "commands"
+ATTR_TOPIC = "topic"
+ATTR_PAYLOAD = "payload"
+ATTR_STATE = "state"
+ATTR_BRIGHTNESS = "brightness"
+ATTR_COLOR_TEMP_KELVIN = "color_temp_kelvin"
+ATTR_PERCENTAGE = "percentage"
+ATTR_OSCILLATING = "oscillating"
+ATTR_POSITION = "position"
+ATTR_HVAC_MODE = "hvac_mode"
+ATTR_TEMPERATURE = "temperature"
+ATTR_FAN_MODE = "fan_mode"
+ATTR_SWING_MODE = "swing_mode"
+
+COMMAND_SCHEMA = vol.All(
+    {
+        vol.Exclusive(ATTR_ENTITY_ID, "target"): cv.entity_id,
+        vol.Exclusive(ATTR_TOPIC, "target"): cv.string,
+        vol.Optional(ATTR_PAYLOAD): cv.string,
+        vol.Optional(ATTR_STATE): vol.In([MSG_ON, MSG_OFF, COVER_PAUSE]),
+        vol.Optional(ATTR_BRIGHTNESS): vol.All(vol.Coerce(int), vol.Range(min=0, max=255)),
+        vol.Optional(ATTR_COLOR_TEMP_KELVIN): vol.Coerce(int),
+        vol.Optional(ATTR_PERCENTAGE): vol.All(vol.Coerce(int), vol.Range(min=0, max=100)),
+        vol.Optional(ATTR_OSCILLATING): cv.boolean,
+        vol.Optional(ATTR_POSITION): vol.All(vol.Coerce(int), vol.Range(min=0, max=100)),
+        vol.Optional(ATTR_HVAC_MODE): vol.In([*HVAC_MODES_REVERSE, MSG_OFF]),
+        vol.Optional(ATTR_TEMPERATURE): vol.Coerce(float),
+        vol.Optional(ATTR_FAN_MODE): vol.In(FAN_MODES_REVERSE),
+        vol.Optional(ATTR_SWING_MODE): vol.In(SWING_MODES_REVERSE),
+    },
+    cv.has_at_least_one_key(ATTR_ENTITY_ID, ATTR_TOPIC),
+)
+
+SEND_BATCH_SCHEMA = vol.Schema(
+    {vol.Required(ATTR_COMMANDS): vol.All(cv.ensure_list, [COMMAND_SCHEMA])}
+)
+
+@callback
+def async_setup_services(hass: HomeAssistant) -> None:
+    """注册巴法云集成的服务."""
+
+    async def async_send_batch(call: ServiceCall) -> None:
+        """一次发送多条命令, 所有乐观状态只通知一次."""
+        batches: dict[Any, dict[str, str]] = defaultdict(dict)
+        for command in call.data[ATTR_COMMANDS]:
+            coordinator, topic = _async_resolve_target(hass, command)
+            device = coordinator.data[topic]
+            if ATTR_PAYLOAD in command:
+                batches[coordinator][topic] = command[ATTR_PAYLOAD]
+                continue
+            # 以实体为目标时, 设备消息中没有的属性(如关机空调的设定温度)沿用实体的当前属性
+            state = (
+                hass.states.get(command[ATTR_ENTITY_ID])
+                if ATTR_ENTITY_ID in command
+                else None
+            )
+            batches[coordinator][topic] = encode_command(
+                device.type,
+                coordinator.get_state(topic),
+                command,
+                state.attributes if state is not None else None,
+            )
+
+        for coordinator, commands in batches.items():
+            mqtt_client = hass.data[DOMAIN][coordinator.config_entry.entry_id]["mqtt_client"]
+            published = coordinator.async_apply_commands(commands)
+            for topic, payload in commands.items():
+                mqtt_client.async_send(f"{topic}/set", payload, published[topic])
+
+    hass.services.async_register(
+        DOMAIN, SERVICE_SEND_BATCH, async_send_batch, schema=SEND_BATCH_SCHEMA
+    )
+
+@callback
+def _async_resolve_target(hass: HomeAssistant, command: dict[str, Any]) -> tuple[Any, str]:
+    """把实体ID或主题解析为所属的协调器和主题."""
+    if (topic := command.get(ATTR_TOPIC)) is None:
+        entity_id = command[ATTR_ENTITY_ID]
+        entity = er.async_get(hass).async_get(entity_id)
+        device = (
+            dr.async_get(hass).async_get(entity.device_id)
+            if entity is not None and entity.platform == DOMAIN and entity.device_id
+            else None
+        )
+        if device is None:
+            raise HomeAssistantError(f"{entity_id} 不是巴法云设备")
+        topic = next(
+            (identifier for domain, identifier in device.identifiers if domain == DOMAIN),
+            None,
+        )
+
+    for entry_data in hass.data.get(DOMAIN, {}).values():
+        coordinator = entry_data["coordinator"]
+        if coordinator.data is not None and topic in coordinator.data:
+            return coordinator, topic
+    raise HomeAssistantError(f"未找到主题 {topic}")
+
+def encode_command(
+    device_type: str,
+    current: str,
+    data: dict[str, Any],
+    attributes: Mapping[str, Any] | None = None,
+) -> str:
+    """按设备类型生成命令, 未指定的属性沿用设备的当前状态, 其次沿用实体属性."""
+    state = data.get(ATTR_STATE)
+    attributes = attributes or {}
+    if device_type == "switch":
+        return encode_switch(state != MSG_OFF)
+
+    if device_type == "light":
+        light = decode("light", current)
+        return encode_light(
+            state != MSG_OFF,
+            data.get(ATTR_BRIGHTNESS, light.brightness or 255),
+            data.get(ATTR_COLOR_TEMP_KELVIN, light.kelvin or MIN_KELVIN),
+        )
+
+    if device_type == "fan":
+        fan = decode("fan", current)
+        percentage = data.get(ATTR_PERCENTAGE)
+        if state == MSG_OFF or percentage == 0:
+            return encode_fan(False)
+        speed = (
+            percentage_to_ordered_list_item(
+                list(range(1, FAN_SPEED_COUNT + 1)), percentage
+            )
+            if percentage is not None
+            else fan.speed or 1
+        )
+        return encode_fan(True, speed, data.get(ATTR_OSCILLATING, fan.oscillating))
+
+    if device_type == "cover":
+        if ATTR_POSITION in data:
+            return encode_cover(MSG_ON, data[ATTR_POSITION])
+        return encode_cover(state or MSG_ON)
+
+    if device_type == "climate":
+        hvac_mode = data.get(ATTR_HVAC_MODE)
+        if state == MSG_OFF or hvac_mode == MSG_OFF:
+            return encode_climate(False)
+        # 关机消息不带温度, 风速和扫风, 这些属性由实体保留
+        climate = decode("climate", current)
+        return encode_climate(
+            True,
+            HVAC_MODES_REVERSE.get(hvac_mode, climate.mode or "1"),
+            data.get(
+                ATTR_TEMPERATURE,
+                climate.temperature or attributes.get(ATTR_TEMPERATURE) or MIN_TEMP,
+            ),
+            FAN_MODES_REVERSE.get(data.get(ATTR_FAN_MODE))
+            or climate.fan
+            or FAN_MODES_REVERSE.get(attributes.get(ATTR_FAN_MODE), "0"),
+            SWING_MODES_REVERSE.get(data.get(ATTR_SWING_MODE))
+            or climate.swing
+            or SWING_MODES_REVERSE.get(attributes.get(ATTR_SWING_MODE), "0#0"),
+        )
+
+    raise HomeAssistantError(f"{device_type} 设备不支持命令")
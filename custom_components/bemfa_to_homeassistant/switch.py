@@ -6,15 +6,14 @@ from typing import Any
 
 from homeassistant.components.switch import SwitchEntity
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 from homeassistant.helpers.update_coordinator import CoordinatorEntity
 
+from .codec import decode, encode_switch
 from .const import (
     DOMAIN,
     CONF_API_KEY,
-    MSG_ON,
-    MSG_OFF,
 )
 from .helpers import BemfaBaseEntity
 
@@ -29,24 +28,31 @@ async def async_setup_entry(
     coordinator = hass.data[DOMAIN][entry.entry_id]["coordinator"]
     mqtt_client = hass.data[DOMAIN][entry.entry_id]["mqtt_client"]
     
-    entities = [
-        BemfaSwitch(coordinator, mqtt_client, topic, entry)
-        for topic, device in coordinator.data.items()
-        if device["type"] == "switch"
-    ]
-    
-    if entities:
-        async_add_entities(entities)
+    @callback
+    def async_add_devices(added: set[str], removed: set[str]) -> None:
+        """为新增的主题创建开关实体, 移除的主题由设备注册表清理."""
+        entities = [
+            BemfaSwitch(coordinator, mqtt_client, topic, entry)
+            for topic in added
+            if coordinator.data[topic].type == "switch"
+        ]
+        if entities:
+            async_add_entities(entities)
+
+    async_add_devices(coordinator.data.keys(), set())
+    entry.async_on_unload(coordinator.async_add_device_listener(async_add_devices))
 
 class BemfaSwitch(CoordinatorEntity, BemfaBaseEntity, SwitchEntity):
     """巴法云开关设备."""
 
+    _state_attrs = ("_attr_is_on",)
     _attr_has_entity_name = True
 
     def __init__(self, coordinator, mqtt_client, topic, entry):
         """初始化巴法云开关设备."""
         super().__init__(coordinator)
-        BemfaBaseEntity.__init__(self, topic, coordinator.data[topic]["name"])
+        device = coordinator.data[topic]
+        BemfaBaseEntity.__init__(self, topic, coordinator.get_device_info(topic))
         
         self._topic = topic
         self._mqtt_client = mqtt_client
@@ -54,37 +60,40 @@ class BemfaSwitch(CoordinatorEntity, BemfaBaseEntity, SwitchEntity):
         self._attr_unique_id = f"{DOMAIN}_{topic}_switch"
         self._attr_name = "开关"
         
-        self._parse_state(coordinator.data[topic].get("state", ""))
+        self._parse_state(device.state)
 
     def _parse_state(self, state: str) -> None:
         """解析设备状态."""
-        self._attr_is_on = state.lower() == MSG_ON
+        self._attr_is_on = decode("switch", state).is_on
 
     async def async_turn_on(self, **kwargs: Any) -> None:
         """打开开关."""
-        await self._async_send_command(MSG_ON)
+        await self._async_send_command(encode_switch(True))
 
     async def async_turn_off(self, **kwargs: Any) -> None:
         """关闭开关."""
-        await self._async_send_command(MSG_OFF)
+        await self._async_send_command(encode_switch(False))
 
     async def _async_send_command(self, command: str) -> None:
         """发送命令到巴法云."""
         try:
-            self._mqtt_client.publish(f"{self._topic}/set", command)
-            self._attr_is_on = command.lower() == MSG_ON
+            self._mqtt_client.async_send(
+                f"{self._topic}/set",
+                command,
+                self.coordinator.async_track_command(self._topic, command),
+            )
+            self._parse_state(command)
             self.async_write_ha_state()
-            await self.coordinator.async_request_refresh()
         except Exception as ex:
             _LOGGER.error("发送命令失败: %s", ex)
 
     @property
     def available(self) -> bool:
         """返回设备是否可用."""
-        return self.coordinator.data.get(self._topic, {}).get("online", True)
+        device = self.coordinator.data.get(self._topic)
+        return device.online if device is not None else True
 
     def _handle_coordinator_update(self) -> None:
         """处理设备状态更新."""
-        device = self.coordinator.data.get(self._topic, {})
-        self._parse_state(device.get("state", ""))
-        self.hass.loop.call_soon_threadsafe(self.async_write_ha_state)
\ No newline at end of file
+        self._parse_state(self.coordinator.get_state(self._topic))
+        self.async_write_ha_state_if_changed()
@@ -0,0 +1,399 @@
+"""巴法云MQTT传输层."""
+from __future__ import annotations
+
+import logging
+import threading
+from collections.abc import Callable, Iterable
+from time import monotonic
+from typing import Any
+
+import paho.mqtt.client as mqtt
+
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+from homeassistant.helpers.event import async_call_later
+
+from .const import (
+    MQTT_HOST,
+    MQTT_PORT,
+    MQTT_KEEPALIVE,
+    MQTT_RECONNECT_DELAY,
+    MQTT_SUBSCRIBE_BATCH,
+    TRANSPORT_ASYNCIO,
+    TRANSPORT_THREAD,
+)
+from .metrics import BemfaMetrics
+
+_LOGGER = logging.getLogger(__name__)
+
+# 事件循环模式下调用 loop_misc 的间隔(秒), 用于发送心跳和检测超时
+MISC_LOOP_INTERVAL = 1
+
+class BemfaMqttTransport:
+    """巴法云MQTT连接.
+
+    支持两种模式: thread 模式沿用 paho 的 loop_start 后台线程;
+    asyncio 模式由 Home Assistant 的事件循环直接驱动套接字读写,
+    消息回调在事件循环中执行, 没有额外线程和跨线程切换.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        client_id: str,
+        on_message: Callable[[str, str], None],
+        mode: str = TRANSPORT_THREAD,
+        metrics: BemfaMetrics | None = None,
+    ) -> None:
+        """初始化MQTT连接."""
+        self._hass = hass
+        self._mode = mode
+        self._metrics = metrics or BemfaMetrics()
+        self._on_message_cb = on_message
+        self._topics: set[str] = set()
+        self._loop_thread_id = threading.get_ident()
+        self._stopping = False
+        self._sock_fd: int | None = None
+        self._misc_timer: Any = None
+        self._reconnect_unsub: Callable[[], None] | None = None
+        self._connect_listeners: list[CALLBACK_TYPE] = []
+        self._subscribe_lock = threading.Lock()
+        self._pending_subacks: set[int] = set()
+        self._ack_callbacks: dict[int, CALLBACK_TYPE] = {}
+        self._subscribe_started = 0.0
+        self.connected = False
+        self.fully_subscribed = False
+        self.last_subscribe_duration: float | None = None
+
+        self._client = mqtt.Client(client_id=client_id)
+        self._client.on_connect = self._on_connect
+        self._client.on_disconnect = self._on_disconnect
+        self._client.on_message = self._on_message
+        self._client.on_subscribe = self._on_subscribe
+        self._client.on_publish = self._on_publish
+
+        if mode == TRANSPORT_ASYNCIO:
+            self._client.on_socket_open = self._on_socket_open
+            self._client.on_socket_close = self._on_socket_close
+            self._client.on_socket_register_write = self._on_socket_register_write
+            self._client.on_socket_unregister_write = self._on_socket_unregister_write
+
+    @property
+    def mode(self) -> str:
+        """返回连接模式."""
+        return self._mode
+
+    async def async_connect(self) -> None:
+        """连接到巴法云MQTT服务器, 域名解析和TCP连接在执行器中进行."""
+        self._stopping = False
+        await self._hass.async_add_executor_job(
+            self._client.connect, MQTT_HOST, MQTT_PORT, MQTT_KEEPALIVE
+        )
+        if self._mode == TRANSPORT_ASYNCIO:
+            # 之后的读写都由事件循环驱动
+            self._async_schedule_misc()
+        else:
+            self._client.loop_start()
+
+    async def async_disconnect(self) -> None:
+        """断开连接并释放资源."""
+        self._stopping = True
+        self._ack_callbacks.clear()
+        if self._reconnect_unsub is not None:
+            self._reconnect_unsub()
+            self._reconnect_unsub = None
+        if self._misc_timer is not None:
+            self._misc_timer.cancel()
+            self._misc_timer = None
+
+        if self._mode == TRANSPORT_ASYNCIO:
+            # 移除写回调前先发出 DISCONNECT 报文, 否则服务器只能等到保活超时
+            self._client.disconnect()
+            self._client.loop_write()
+            self._async_remove_socket()
+        else:
+            # 先断开再停止线程, 否则还有未确认的 QoS 1 消息时 loop_stop 会一直等待
+            self._client.disconnect()
+            self._client.loop_stop()
+
+    async def async_reconnect(self) -> None:
+        """强制重新建立连接, 重连成功后会自动重新订阅."""
+        if self._stopping:
+            return
+        # paho 的 reconnect 直接关闭旧套接字而不调用 on_disconnect, 需要在这里重置,
+        # 订阅确认在新连接上重新等待
+        self.connected = False
+        self.fully_subscribed = False
+        if self._mode == TRANSPORT_ASYNCIO:
+            if self._reconnect_unsub is not None:
+                self._reconnect_unsub()
+                self._reconnect_unsub = None
+            await self._async_reconnect_client()
+        else:
+            await self._hass.async_add_executor_job(self._reconnect_threaded)
+
+    def _reconnect_threaded(self) -> None:
+        """停止后台线程后重新连接, 无论成功与否都重新启动后台线程.
+
+        未确认的 QoS 1 消息由 paho 保留, 重新连接后自动重发.
+        """
+        self._client.disconnect()
+        self._client.loop_stop()
+        try:
+            self._client.reconnect()
+        finally:
+            self._client.loop_start()
+
+    def publish(
+        self,
+        topic: str,
+        payload: str,
+        qos: int = 0,
+        on_ack: CALLBACK_TYPE | None = None,
+    ) -> mqtt.MQTTMessageInfo:
+        """发布消息并计数.
+
+        QoS 大于 0 时, 服务器确认后在事件循环中调用 on_ack. 断线期间 paho 会保留
+        消息并在重连后重发, 因此未连接时也登记回调. 必须在事件循环中调用.
+        """
+        info = self._client.publish(topic, payload, qos)
+        self._metrics.publishes += 1
+        if topic.endswith("/set"):
+            self._metrics.commands += 1
+        if on_ack is not None and qos > 0 and info.rc in (
+            mqtt.MQTT_ERR_SUCCESS,
+            mqtt.MQTT_ERR_NO_CONN,
+        ):
+            self._ack_callbacks[info.mid] = on_ack
+        return info
+
+    @callback
+    def discard_ack(self, mid: int) -> None:
+        """发布方不再等待该报文的确认时释放其确认回调."""
+        self._ack_callbacks.pop(mid, None)
+
+    @callback
+    def async_add_connect_listener(self, update_callback: CALLBACK_TYPE) -> CALLBACK_TYPE:
+        """注册连接成功并发出订阅后的监听器."""
+        self._connect_listeners.append(update_callback)
+
+        @callback
+        def remove_listener() -> None:
+            """移除监听器."""
+            self._connect_listeners.remove(update_callback)
+
+        return remove_listener
+
+    @callback
+    def _async_notify_connected(self) -> None:
+        """通知所有连接监听器."""
+        for update_callback in list(self._connect_listeners):
+            update_callback()
+
+    @callback
+    def async_subscribe(self, topics: set[str]) -> None:
+        """订阅主题, 重连后会自动重新订阅."""
+        new_topics = topics - self._topics
+        self._topics |= new_topics
+        if self.connected and new_topics:
+            self._subscribe_batched(new_topics)
+
+    @callback
+    def async_unsubscribe(self, topics: set[str]) -> None:
+        """取消订阅主题, 重连后也不再订阅."""
+        removed = topics & self._topics
+        self._topics -= removed
+        if not self.connected or not removed:
+            return
+        removed_list = list(removed)
+        for start in range(0, len(removed_list), MQTT_SUBSCRIBE_BATCH):
+            result, _mid = self._client.unsubscribe(
+                removed_list[start:start + MQTT_SUBSCRIBE_BATCH]
+            )
+            if result != mqtt.MQTT_ERR_SUCCESS:
+                _LOGGER.warning("MQTT取消订阅失败: %s", mqtt.error_string(result))
+
+    def _subscribe_batched(self, topics: Iterable[str]) -> None:
+        """把主题分批放进多主题 SUBSCRIBE 报文, 并记录等待 SUBACK 的报文ID."""
+        topics = list(topics)
+        with self._subscribe_lock:
+            if not self._pending_subacks:
+                self._subscribe_started = monotonic()
+                self.fully_subscribed = False
+            for start in range(0, len(topics), MQTT_SUBSCRIBE_BATCH):
+                batch = topics[start:start + MQTT_SUBSCRIBE_BATCH]
+                result, mid = self._client.subscribe([(topic, 0) for topic in batch])
+                if result == mqtt.MQTT_ERR_SUCCESS:
+                    self._pending_subacks.add(mid)
+                else:
+                    _LOGGER.warning("MQTT订阅失败: %s", mqtt.error_string(result))
+
+    def _call_on_loop(self, func: Callable[..., None], *args: Any) -> None:
+        """在事件循环中执行回调."""
+        if threading.get_ident() == self._loop_thread_id:
+            func(*args)
+        else:
+            self._hass.loop.call_soon_threadsafe(func, *args)
+
+    def _on_connect(self, client, userdata, flags, rc) -> None:
+        """MQTT连接回调."""
+        if rc != 0:
+            _LOGGER.warning("MQTT连接被拒绝: %s", mqtt.connack_string(rc))
+            return
+
+        self.connected = True
+        self._metrics.count_connect()
+        with self._subscribe_lock:
+            self._pending_subacks.clear()
+        if self._topics:
+            self._subscribe_batched(self._topics)
+        self._call_on_loop(self._async_notify_connected)
+
+    def _on_subscribe(self, client, userdata, mid, granted_qos) -> None:
+        """MQTT订阅确认回调, 所有报文都确认后记录订阅耗时."""
+        with self._subscribe_lock:
+            if mid not in self._pending_subacks:
+                return
+            self._pending_subacks.discard(mid)
+            if self._pending_subacks:
+                return
+            self.fully_subscribed = True
+            self.last_subscribe_duration = monotonic() - self._subscribe_started
+        _LOGGER.debug(
+            "已订阅 %d 个主题, 耗时 %.3f 秒",
+            len(self._topics),
+            self.last_subscribe_duration,
+        )
+
+    def _on_publish(self, client, userdata, mid) -> None:
+        """MQTT发布确认回调, 在事件循环中通知发布方."""
+        self._call_on_loop(self._async_on_publish, mid)
+
+    @callback
+    def _async_on_publish(self, mid: int) -> None:
+        """调用报文ID对应的确认回调."""
+        if (on_ack := self._ack_callbacks.pop(mid, None)) is not None:
+            on_ack()
+
+    def _on_disconnect(self, client, userdata, rc) -> None:
+        """MQTT断开回调."""
+        self.connected = False
+        self.fully_subscribed = False
+        self._metrics.count_disconnect()
+        if rc != 0:
+            _LOGGER.warning("MQTT连接断开: %s", mqtt.error_string(rc))
+        if self._mode == TRANSPORT_ASYNCIO and not self._stopping:
+            self._call_on_loop(self._async_schedule_reconnect)
+
+    def _on_message(self, client, userdata, msg) -> None:
+        """MQTT消息回调."""
+        try:
+            self._on_message_cb(msg.topic, msg.payload.decode())
+        except Exception as err:
+            _LOGGER.error("处理MQTT消息错误: %s", err)
+
+    @callback
+    def _async_schedule_reconnect(self) -> None:
+        """稍后在执行器中重新连接."""
+        if self._reconnect_unsub is not None or self._stopping:
+            return
+        self._reconnect_unsub = async_call_later(
+            self._hass, MQTT_RECONNECT_DELAY, self._async_reconnect
+        )
+
+    async def _async_reconnect(self, _now: Any = None) -> None:
+        """重新连接到MQTT服务器."""
+        self._reconnect_unsub = None
+        if self._stopping:
+            return
+        try:
+            await self._async_reconnect_client()
+        except OSError as err:
+            _LOGGER.warning("MQTT重新连接失败: %s", err)
+            self._async_schedule_reconnect()
+
+    async def _async_reconnect_client(self) -> None:
+        """在执行器中重新连接.
+
+        重新连接期间事件循环不能再对同一个客户端调用 loop_read 和 loop_misc,
+        因此先移除读写回调和 loop_misc 定时器, 新套接字打开后会重新注册读回调.
+        """
+        if self._misc_timer is not None:
+            self._misc_timer.cancel()
+            self._misc_timer = None
+        self._async_remove_socket()
+        try:
+            await self._hass.async_add_executor_job(self._client.reconnect)
+        finally:
+            self._async_schedule_misc()
+
+    @callback
+    def _async_schedule_misc(self) -> None:
+        """定时调用 loop_misc 维持心跳."""
+        if self._misc_timer is not None:
+            self._misc_timer.cancel()
+            self._misc_timer = None
+        if self._stopping:
+            return
+        self._misc_timer = self._hass.loop.call_later(
+            MISC_LOOP_INTERVAL, self._async_misc
+        )
+
+    @callback
+    def _async_misc(self) -> None:
+        """处理心跳和超时."""
+        self._client.loop_misc()
+        self._async_schedule_misc()
+
+    def _on_socket_open(self, client, userdata, sock) -> None:
+        """套接字打开后注册读回调."""
+        self._call_on_loop(self._async_on_socket_open, sock.fileno())
+
+    @callback
+    def _async_on_socket_open(self, fileno: int) -> None:
+        """在事件循环中注册读回调."""
+        self._async_remove_socket()
+        self._sock_fd = fileno
+        self._hass.loop.add_reader(fileno, self._async_reader_callback)
+
+    def _on_socket_close(self, client, userdata, sock) -> None:
+        """套接字关闭前移除读写回调."""
+        self._call_on_loop(self._async_remove_socket)
+
+    @callback
+    def _async_remove_socket(self) -> None:
+        """移除套接字的读写回调."""
+        if self._sock_fd is None:
+            return
+        self._hass.loop.remove_reader(self._sock_fd)
+        self._hass.loop.remove_writer(self._sock_fd)
+        self._sock_fd = None
+
+    def _on_socket_register_write(self, client, userdata, sock) -> None:
+        """有数据待发送时注册写回调."""
+        self._call_on_loop(self._async_register_write)
+
+    @callback
+    def _async_register_write(self) -> None:
+        """在事件循环中注册写回调."""
+        if self._sock_fd is not None:
+            self._hass.loop.add_writer(self._sock_fd, self._async_writer_callback)
+
+    def _on_socket_unregister_write(self, client, userdata, sock) -> None:
+        """数据发送完毕后移除写回调."""
+        self._call_on_loop(self._async_unregister_write)
+
+    @callback
+    def _async_unregister_write(self) -> None:
+        """在事件循环中移除写回调."""
+        if self._sock_fd is not None:
+            self._hass.loop.remove_writer(self._sock_fd)
+
+    @callback
+    def _async_reader_callback(self) -> None:
+        """套接字可读."""
+        self._client.loop_read()
+
+    @callback
+    def _async_writer_callback(self) -> None:
+        """套接字可写."""
+        self._client.loop_write()
@@ -0,0 +1,129 @@
+"""巴法云MQTT链路看门狗."""
+from __future__ import annotations
+
+import logging
+import random
+from collections.abc import Awaitable, Callable
+from time import monotonic
+from typing import TYPE_CHECKING, Any
+
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+from homeassistant.helpers.event import async_call_later
+
+from .const import (
+    INTERVAL_PING_RECEIVE,
+    MAX_PING_LOST,
+    RECONNECT_BASE_DELAY,
+    RECONNECT_MAX_DELAY,
+)
+from .heartbeat import BemfaHeartbeat
+
+if TYPE_CHECKING:
+    from .connection import BemfaConnectionManager
+
+_LOGGER = logging.getLogger(__name__)
+
+class BemfaWatchdog:
+    """心跳连续丢失后判定链路失效, 按带抖动的指数退避强制重连.
+
+    重连后立即发送心跳, 收到回传即视为恢复, 记录恢复耗时并触发一次全量同步.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        heartbeat: BemfaHeartbeat,
+        transport: BemfaConnectionManager,
+        resync: Callable[[], Awaitable[Any]],
+    ) -> None:
+        """初始化看门狗."""
+        self._hass = hass
+        self._heartbeat = heartbeat
+        self._transport = transport
+        self._resync = resync
+        self._unsub_retry: CALLBACK_TYPE | None = None
+        self._down_since: float | None = None
+        self._attempt = 0
+        self.reconnects = 0
+        self.last_recovery_time: float | None = None
+
+    @property
+    def link_down(self) -> bool:
+        """返回链路是否被判定为失效."""
+        return self._down_since is not None
+
+    @callback
+    def async_start(self) -> CALLBACK_TYPE:
+        """开始监视心跳, 返回停止函数."""
+        remove_listeners = (
+            self._heartbeat.async_add_listener(self._async_heartbeat_changed),
+            self._transport.async_add_connect_listener(self._async_connected),
+        )
+
+        @callback
+        def stop() -> None:
+            """停止看门狗."""
+            for remove_listener in remove_listeners:
+                remove_listener()
+            self._async_cancel_retry()
+
+        return stop
+
+    @callback
+    def _async_heartbeat_changed(self) -> None:
+        """心跳状态变化."""
+        if self._heartbeat.healthy:
+            if self._down_since is None:
+                return
+            self.last_recovery_time = monotonic() - self._down_since
+            _LOGGER.info("MQTT链路已恢复, 耗时 %.1f 秒", self.last_recovery_time)
+            self._down_since = None
+            self._attempt = 0
+            self._async_cancel_retry()
+            self._hass.async_create_task(self._resync())
+            return
+
+        if self._heartbeat.ping_lost >= MAX_PING_LOST and self._down_since is None:
+            _LOGGER.warning("连续 %d 次心跳丢失, 重新连接MQTT", self._heartbeat.ping_lost)
+            self._down_since = monotonic()
+            self._async_schedule_retry(0)
+
+    @callback
+    def _async_connected(self) -> None:
+        """重连并重新订阅后立即发送心跳确认链路."""
+        if self._down_since is not None:
+            self._heartbeat.async_send_ping()
+
+    @callback
+    def _async_schedule_retry(self, delay: float) -> None:
+        """安排下一次重连."""
+        self._async_cancel_retry()
+        self._unsub_retry = async_call_later(self._hass, delay, self._async_reconnect)
+
+    @callback
+    def _async_cancel_retry(self) -> None:
+        """取消等待中的重连."""
+        if self._unsub_retry is not None:
+            self._unsub_retry()
+            self._unsub_retry = None
+
+    async def _async_reconnect(self, _now: Any) -> None:
+        """强制重连, 并在链路未恢复时按退避时间再次重连."""
+        self._unsub_retry = None
+        if self._down_since is None:
+            return
+
+        self.reconnects += 1
+        delay = min(RECONNECT_MAX_DELAY, RECONNECT_BASE_DELAY * 2**self._attempt)
+        delay = random.uniform(delay / 2, delay)
+        self._attempt += 1
+        try:
+            await self._transport.async_reconnect()
+        except OSError as err:
+            _LOGGER.warning("MQTT重新连接失败: %s", err)
+        else:
+            # 连接已建立, 至少等待一次心跳接收超时再决定是否重试
+            delay = max(delay, INTERVAL_PING_RECEIVE)
+
+        if self._down_since is not None:
+            self._async_schedule_retry(delay)